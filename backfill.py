@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from cache import RawResponseCache, to_western_date
+from parsers import QUOTE_FIELDS
+from price_store import PriceStore
+from ratelimit import HostRateLimiter
+from seachprice import StockDataFetcher
+from trading_calendar import TradingCalendar
+
+
+class BackfillJournal:
+    """每完成一個交易日就寫一行 JSON 並 fsync，中斷後可從上次停下的地方繼續。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 中斷時可能留下寫到一半的最後一行
+                    self.done.add(entry['date'])
+
+    def record(self, date, rows):
+        entry = {'date': date, 'rows': rows, 'finished_at': datetime.now().isoformat(timespec='seconds')}
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(date)
+
+
+class BackfillScheduler:
+    """把多年的區間拆成 (市場, 交易日) 工作項目，逐日寫入 PriceStore 並記錄在日誌中。
+
+    上市與上櫃各自一個執行緒與各自的速率限制；每一天解析完立刻把 fields 的所有欄位寫入分區，記憶體用量不隨區間長度增加。
+    休市日由 TradingCalendar 學習，抓取失敗的日期不會寫入日誌，下次執行時會重試。
+    """
+
+    def __init__(self, start_date, end_date, markets=('tse', 'otc'), root='store', rate=0.5, max_workers=2,
+                 cache_dir='cache', fields=QUOTE_FIELDS):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.markets = markets
+        self.root = root
+        self.rate = rate
+        self.max_workers = max_workers
+        self.fields = fields
+        self.cache = RawResponseCache(cache_dir) if cache_dir else None
+        self.calendar = TradingCalendar()
+        self.stop = threading.Event()
+
+    def pending(self, market, journal, store):
+        """尚未完成的交易日（西元 YYYYMMDD）。"""
+        days = self.calendar.trading_days(self.start_date, self.end_date, market)
+        return [d.strftime('%Y%m%d') for d in days
+                if d.strftime('%Y%m%d') not in journal.done and not store.has_date(d.strftime('%Y%m%d'))]
+
+    def run_market(self, market):
+        store = PriceStore(market, self.root)
+        journal = BackfillJournal(os.path.join(store.dir, 'backfill_journal.jsonl'))
+        fetcher = StockDataFetcher(stock_type=market, max_workers=self.max_workers,
+                                   rate_limiter=HostRateLimiter(rate=self.rate), cache=self.cache,
+                                   calendar=self.calendar, fields=self.fields)
+        pending = self.pending(market, journal, store)
+        print(f"{market} 待處理 {len(pending)} 個交易日（已完成 {len(journal.done)} 個）")
+
+        def work(date):
+            label = fetcher._convert_to_rocdate(date) if market == 'otc' else date
+            return date, label, fetcher.get_daily_quotes(label, market)
+
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # 分批提交，同時在記憶體中的日資料最多 2 × max_workers 天
+            batch_size = self.max_workers * 2
+            for i in range(0, len(pending), batch_size):
+                if self.stop.is_set():
+                    break
+                for date, label, daily_data in executor.map(work, pending[i:i + batch_size]):
+                    if daily_data.empty:
+                        print(f"{market} {label} 沒有數據（可能是假日），下次執行會再確認")
+                        continue
+                    store.append(daily_data, label)
+                    journal.record(to_western_date(date), len(daily_data))
+                    completed += 1
+        print(f"{market} 本次完成 {completed} 個交易日")
+        return completed
+
+    def run(self):
+        """上市與上櫃平行回補；Ctrl-C 中斷後重新執行即可續傳。"""
+        executor = ThreadPoolExecutor(max_workers=len(self.markets))
+        try:
+            futures = [executor.submit(self.run_market, market) for market in self.markets]
+            return dict(zip(self.markets, (future.result() for future in futures)))
+        except KeyboardInterrupt:
+            # 讓各市場在目前這一批完成後停下
+            self.stop.set()
+            print("已中斷，已完成的交易日都記錄在日誌中，重新執行即可續傳")
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+
+# 使用示例
+if __name__ == "__main__":
+    scheduler = BackfillScheduler('2021-01-01', '2024-09-06')
+    scheduler.run()
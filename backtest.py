@@ -0,0 +1,234 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from cache import to_western_date
+from classification import SecurityClassifier
+from price_matrix import PriceMatrix
+from returns import forward_fill
+from screening import FLOW_COLUMNS
+
+TRADING_DAYS = 252
+
+
+def cross_sectional_rank(values):
+    """每個日期（欄）內的百分位排名，0 為最小、1 為最大，NaN 保持 NaN。"""
+    # 轉置成每個日期一列的連續陣列再排序，比沿著跨步的軸排序快得多
+    values = np.ascontiguousarray(np.asarray(values, dtype='float64').T)
+    missing = np.isnan(values)
+    order = np.argsort(np.where(missing, np.inf, values), axis=1)
+    ranks = np.empty(values.shape)
+    np.put_along_axis(ranks, order, np.arange(values.shape[1], dtype='float64')[None, :], axis=1)
+    count = (~missing).sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ranks = ranks / (count - 1)
+    ranks[missing] = np.nan
+    return ranks.T
+
+
+def rank_ic(scores, forward):
+    """每個日期的 Spearman 相關係數（排名 IC）：訊號排名與之後報酬排名的相關程度。"""
+    both = ~(np.isnan(scores) | np.isnan(forward))
+    x = cross_sectional_rank(np.where(both, scores, np.nan))
+    y = cross_sectional_rank(np.where(both, forward, np.nan))
+    x = x - np.nanmean(x, axis=0)
+    y = y - np.nanmean(y, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nansum(x * y, axis=0) / np.sqrt(np.nansum(x * x, axis=0) * np.nansum(y * y, axis=0))
+
+
+class BacktestResult:
+    """單一組參數的回測結果，每個元素對應一個換股日。"""
+
+    def __init__(self, params, dates, gross, net, benchmark, turnover, ic, picks, symbols):
+        self.params = params
+        self.dates = dates
+        self.gross = gross
+        self.net = net
+        self.benchmark = benchmark
+        self.turnover = turnover
+        self.ic = ic
+        self.picks = picks          # (top_n, 換股日數) 的列號，-1 表示該位置沒有股票
+        self.symbols = symbols
+
+    def holdings(self, i):
+        """第 i 個換股日買進的股票代碼（依訊號由大到小）。"""
+        return [self.symbols[j] for j in self.picks[:, i] if j >= 0]
+
+    def equity(self):
+        """淨值曲線（扣除交易成本），起點為 1。"""
+        return pd.Series(np.cumprod(1 + self.net), index=self.dates, name='淨值')
+
+    def summary(self):
+        periods_per_year = TRADING_DAYS / self.params['rebalance']
+        equity = np.cumprod(1 + self.net)
+        years = len(self.net) / periods_per_year if len(self.net) else np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            total = equity[-1] - 1 if len(equity) else np.nan
+            volatility = np.std(self.net, ddof=1) * np.sqrt(periods_per_year) if len(self.net) > 1 else np.nan
+            drawdown = equity / np.maximum.accumulate(equity) - 1 if len(equity) else np.array([np.nan])
+            return {**self.params,
+                    '換股次數': len(self.net),
+                    '總報酬': total,
+                    '年化報酬': (1 + total) ** (1 / years) - 1 if years else np.nan,
+                    '年化波動': volatility,
+                    '夏普值': np.mean(self.net) * periods_per_year / volatility if volatility else np.nan,
+                    '最大回撤': drawdown.min(),
+                    '勝率': np.mean(self.net > self.benchmark) if len(self.net) else np.nan,
+                    '基準總報酬': np.prod(1 + self.benchmark) - 1,
+                    '平均換手率': np.mean(self.turnover) if len(self.turnover) else np.nan,
+                    '平均IC': np.nanmean(self.ic) if np.isfinite(self.ic).any() else np.nan}
+
+
+class Backtester:
+    """「買進 N 天漲幅前 top_n 名，每 rebalance 天換股」一類策略的向量化回測。
+
+    所有換股日的訊號、排名與持有期報酬一次以 (股票數 × 換股日數) 的矩陣計算，不逐日迴圈；
+    停牌日沿用前一日收盤價，換股日當天沒有成交的股票不會被選入。
+    flows 為 {'foreign'|'trust'|'dealer': 寬表（張）}，格式同 screening.flows_from_t86，用來套用法人買超門檻。
+    """
+
+    def __init__(self, matrix, flows=None, market=None, classifier=None):
+        if isinstance(matrix, pd.DataFrame):
+            matrix = PriceMatrix.from_frame(matrix)
+        self.matrix = matrix
+        self.symbols = list(matrix.symbols)
+        self.dates = list(matrix.dates)
+        values = np.asarray(matrix.values, dtype='float64')
+        self.traded = ~np.isnan(values)
+        self.prices = forward_fill(values)
+        self.market = market
+        self.classifier = classifier or SecurityClassifier(read_only=True)
+        self.flows = {}
+        for kind, df in (flows or {}).items():
+            df = df.copy()
+            df.columns = [to_western_date(column) for column in df.columns]
+            df = df.T.groupby(level=0).last().T.reindex(index=pd.Index(self.symbols), columns=self.dates)
+            # 以累積和計算任意天數的買超合計；沒有資料的日期視為 0
+            self.flows[kind] = np.cumsum(np.nan_to_num(df.to_numpy(dtype='float64', na_value=np.nan)), axis=1)
+        self._universe = {}
+
+    def universe(self, kinds=None):
+        """證券類別遮罩（classification 的 kinds，例如 ('four_digit',)），None 表示全部。"""
+        key = tuple(kinds) if kinds else None
+        if key not in self._universe:
+            if key is None:
+                self._universe[key] = np.ones(len(self.symbols), dtype=bool)
+            else:
+                self._universe[key] = self.classifier.mask(self.symbols, key, self.market)
+        return self._universe[key]
+
+    def rebalance_days(self, lookback, rebalance, start_date=None, end_date=None):
+        """換股日的欄位位置：需有 lookback 天的歷史，且之後至少還有一天。"""
+        first = lookback
+        if start_date:
+            first = max(first, int(np.searchsorted(self.dates, to_western_date(start_date))))
+        last = len(self.dates) - 1
+        if end_date:
+            last = min(last, int(np.searchsorted(self.dates, to_western_date(end_date), side='right')) - 1)
+        return np.arange(first, last, rebalance)
+
+    def momentum(self, days, lookback):
+        """換股日的 lookback 天漲幅，定義與 returns.compute_returns 相同（S × 換股日數）。"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.prices[:, days] / self.prices[:, days - lookback + 1] - 1
+
+    def forward_returns(self, days, rebalance):
+        """從換股日收盤持有到下一個換股日收盤的報酬（最後一段到資料結尾為止）。"""
+        end = np.minimum(days + rebalance, len(self.dates) - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.prices[:, end] / self.prices[:, days] - 1
+
+    def flow_sum(self, kind, days, flow_days=1):
+        """換股日（含）之前 flow_days 天的法人買超合計（張）。"""
+        if kind not in self.flows:
+            raise KeyError(f"沒有 {kind}（{FLOW_COLUMNS.get(kind, kind)}）的法人買賣超資料")
+        cumulative = self.flows[kind]
+        total = cumulative[:, days]
+        before = days - flow_days
+        total[:, before >= 0] -= cumulative[:, before[before >= 0]]
+        return total
+
+    def eligible(self, days, kinds=None, min_foreign=None, min_trust=None, min_dealer=None, flow_days=1):
+        """換股日可被選入的股票：符合類別、當天有成交，且達到法人買超門檻（與 search_institutional_buying 相同，單位為張）。"""
+        mask = self.universe(kinds)[:, None] & self.traded[:, days]
+        for kind, threshold in (('foreign', min_foreign), ('trust', min_trust), ('dealer', min_dealer)):
+            if threshold is not None:
+                mask &= self.flow_sum(kind, days, flow_days) >= threshold
+        return mask
+
+    def _ranked_picks(self, scores, max_n):
+        """每個換股日訊號最大的 max_n 檔（由大到小），不足時以 -1 補齊；只做部分排序。"""
+        num_symbols = scores.shape[0]
+        filled = np.where(np.isnan(scores), -np.inf, scores)
+        if max_n < num_symbols:
+            idx = np.argpartition(-filled, max_n - 1, axis=0)[:max_n]
+        else:
+            idx = np.broadcast_to(np.arange(num_symbols)[:, None], filled.shape).copy()
+        order = np.argsort(-np.take_along_axis(filled, idx, axis=0), axis=0, kind='stable')
+        idx = np.take_along_axis(idx, order, axis=0)
+        idx[~np.isfinite(np.take_along_axis(filled, idx, axis=0))] = -1
+        return idx
+
+    def _evaluate(self, params, days, forward, benchmark, ic, picks, cost):
+        top_n = params['top_n']
+        picks = picks[:top_n]
+        held = picks >= 0
+        returns = np.take_along_axis(forward, np.where(held, picks, 0), axis=0)
+        returns = np.where(held & np.isfinite(returns), returns, 0.0)
+        count = held.sum(axis=0)
+        gross = np.where(count > 0, returns.sum(axis=0) / np.maximum(count, 1), 0.0)  # 沒有股票時持有現金
+        # 換手率：等權重部位的權重變化總和（第一次建倉算買進一整份）
+        weights = np.zeros((len(self.symbols), len(days)))
+        columns = np.broadcast_to(np.arange(len(days)), picks.shape)
+        np.add.at(weights, (picks[held], columns[held]), 1.0 / np.maximum(count, 1)[columns[held]])
+        turnover = np.abs(np.diff(weights, axis=1, prepend=0.0)).sum(axis=0)
+        net = gross - cost * turnover
+        return BacktestResult(params, [self.dates[d] for d in days], gross, net, benchmark, turnover, ic,
+                              picks, self.symbols)
+
+    def run(self, lookback=5, top_n=20, rebalance=5, kinds=('four_digit',), min_foreign=None, min_trust=None,
+            min_dealer=None, flow_days=1, cost=0.0, start_date=None, end_date=None):
+        """回測單一組參數；cost 為每單位換手的交易成本（例如 0.00585 ≈ 手續費來回加證交稅）。"""
+        return self.sweep((lookback,), (top_n,), (rebalance,), kinds=kinds, min_foreign=min_foreign,
+                          min_trust=min_trust, min_dealer=min_dealer, flow_days=flow_days, cost=cost,
+                          start_date=start_date, end_date=end_date, results=True)[0]
+
+    def sweep(self, lookbacks=(5, 10, 20), top_ns=(10, 20, 50), rebalances=(1, 5, 20), kinds=('four_digit',),
+              min_foreign=None, min_trust=None, min_dealer=None, flow_days=1, cost=0.0, start_date=None,
+              end_date=None, results=False):
+        """參數掃描：同一組 (lookback, rebalance) 只計算一次訊號與排序，不同 top_n 共用。
+
+        回傳每組參數的 summary() DataFrame；results 為 True 時改為回傳 BacktestResult 清單。
+        """
+        output = []
+        max_n = max(top_ns)
+        for lookback, rebalance in itertools.product(lookbacks, rebalances):
+            days = self.rebalance_days(lookback, rebalance, start_date, end_date)
+            if not len(days):
+                continue
+            mask = self.eligible(days, kinds, min_foreign, min_trust, min_dealer, flow_days)
+            scores = np.where(mask, self.momentum(days, lookback), np.nan)
+            forward = self.forward_returns(days, rebalance)
+            with np.errstate(invalid='ignore'):
+                # 基準：同一類別所有當天有成交股票的等權重報酬
+                universe = self.universe(kinds)[:, None] & self.traded[:, days]
+                benchmark = np.nan_to_num(np.nanmean(np.where(universe, forward, np.nan), axis=0))
+            picks = self._ranked_picks(scores, max_n)
+            ic = rank_ic(scores, forward)
+            for top_n in top_ns:
+                params = {'lookback': lookback, 'top_n': top_n, 'rebalance': rebalance}
+                result = self._evaluate(params, days, forward, benchmark, ic, picks, cost)
+                output.append(result if results else result.summary())
+        return output if results else pd.DataFrame(output)
+
+
+# 使用示例
+if __name__ == "__main__":
+    from price_store import PriceStore
+    from screening import combine_markets
+    frames = [PriceStore(market).read_matrix() for market in ('tse', 'otc')]
+    backtester = Backtester(combine_markets(*[df for df in frames if not df.empty]))
+    report = backtester.sweep(cost=0.00585)
+    print(report.sort_values('夏普值', ascending=False).to_string(index=False))
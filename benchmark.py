@@ -0,0 +1,109 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from caculate import calculate_and_sort_gains
+from filter import filter_four_digit_stocks
+from seachprice import StockDataFetcher
+from synthetic import make_otc_payload, make_price_matrix, make_tse_csv
+
+# 超過上一次結果這個倍數即視為效能退步
+REGRESSION_THRESHOLD = 1.25
+
+
+def _time(func, repeat):
+    """執行 repeat 次，回傳最佳與中位數秒數。"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {'best': timings[0], 'median': timings[len(timings) // 2], 'repeat': repeat}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run_benchmarks(n_symbols=2000, n_days=250, tse_symbols=1500, otc_symbols=12000, repeat=5):
+    """量測各熱點函式的耗時，回傳可序列化成 JSON 的結果。"""
+    fetcher = StockDataFetcher()
+    tse_text = make_tse_csv(tse_symbols)
+    otc_content = make_otc_payload(otc_symbols)
+    matrix = make_price_matrix(n_symbols, n_days)
+    new_days = [make_price_matrix(n_symbols, 1, seed=i + 1).iloc[:, 0].rename(f'new{i}') for i in range(5)]
+    results = {}
+
+    results['process_tse_data'] = _time(lambda: fetcher._process_tse_data(tse_text), repeat)
+    results['process_tse_data']['rows'] = len(fetcher._process_tse_data(tse_text))
+    results['process_otc_data'] = _time(lambda: fetcher._process_otc_data(otc_content), repeat)
+    results['process_otc_data']['rows'] = len(fetcher._process_otc_data(otc_content))
+
+    # add_historical_prices 中的合併步驟
+    def merge():
+        new_df = pd.concat(new_days, axis=1)
+        return pd.concat([matrix, new_df], axis=1)
+    results['add_historical_prices_concat'] = _time(merge, repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, 'prices.csv')
+        filtered_file = os.path.join(tmp, 'filtered.csv')
+        gains_file = os.path.join(tmp, 'gains.csv')
+        matrix.to_csv(input_file, encoding='utf-8-sig')
+        results['filter_four_digit_stocks'] = _time(lambda: filter_four_digit_stocks(input_file, filtered_file), repeat)
+        results['calculate_and_sort_gains'] = _time(lambda: calculate_and_sort_gains(filtered_file, gains_file), repeat)
+
+    return {
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'params': {'n_symbols': n_symbols, 'n_days': n_days, 'tse_symbols': tse_symbols, 'otc_symbols': otc_symbols},
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """比較兩次結果的最佳耗時，回傳退步的項目 {名稱: 倍數}。"""
+    regressions = {}
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if old and old['best'] > 0:
+            ratio = result['best'] / old['best']
+            print(f"{name}: {old['best'] * 1000:.1f} ms -> {result['best'] * 1000:.1f} ms ({ratio:.2f}x)")
+            if ratio > threshold:
+                regressions[name] = ratio
+    return regressions
+
+
+if __name__ == "__main__":
+    output_dir = 'benchmarks'
+    os.makedirs(output_dir, exist_ok=True)
+    report = run_benchmarks()
+    output_file = os.path.join(output_dir, f"bench_{report['commit'] or datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+
+    # 與上一份結果比較
+    previous = sorted((os.path.join(output_dir, f) for f in os.listdir(output_dir) if f.endswith('.json')),
+                      key=os.path.getmtime)
+    previous = [f for f in previous if f != output_file]
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"基準測試結果已保存到 {output_file}")
+
+    if previous:
+        with open(previous[-1], 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), report)
+        if regressions:
+            print(f"效能退步：{', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,120 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from parsers import OTC_HEADER, QUOTE_FIELDS, parse_quotes
+from price_store import PriceStore
+
+# 檔名中的日期：民國 YYYMMDD（例如 RSTA3104_1130905.csv）或西元 YYYYMMDD
+FILENAME_DATE = re.compile(r'(?<!\d)(\d{7,8})(?!\d)')
+# 檔案開頭的日期：上櫃為「資料日期:2024/09/05」，上市為「113年09月05日 價格指數」
+PREAMBLE_DATE = re.compile(r'資料日期[:：]\s*(\d{2,4})/(\d{1,2})/(\d{1,2})|(\d{2,4})年(\d{1,2})月(\d{1,2})日')
+TSE_HEADER = '證券代號'.encode('big5')
+HEAD_BYTES = 4096
+
+
+def _date_from_name(name):
+    for digits in FILENAME_DATE.findall(name):
+        if len(digits) == 7:
+            date = f'{int(digits[:3]) + 1911}{digits[3:]}'
+        else:
+            date = digits
+        try:
+            pd.Timestamp(date)
+        except ValueError:
+            continue
+        return date
+    return None
+
+
+def _date_from_head(text):
+    match = PREAMBLE_DATE.search(text)
+    if not match:
+        return None
+    year, month, day = [int(part) for part in filter(None, match.groups())]
+    if year < 1911:
+        year += 1911
+    return f'{year:04d}{month:02d}{day:02d}'
+
+
+def detect(path, market=None):
+    """由表頭判斷市場、由檔頭判斷交易日，回傳 (市場, 西元 YYYYMMDD)；判斷不出時為 None。
+
+    日期以 '資料日期' 或 '年月日' 開頭行為準，沒有時才使用檔名中的日期。
+    """
+    with open(path, 'rb') as f:
+        head = f.read(HEAD_BYTES)
+        content = head
+        if market is None and TSE_HEADER not in head and OTC_HEADER not in head:
+            # 上市 type=ALL 的檔案前面有十幾 KB 的指數區塊，表頭不在開頭，需讀完整個檔案
+            content = head + f.read()
+    if market is None:
+        market = 'tse' if TSE_HEADER in content else 'otc' if OTC_HEADER in content else None
+    date = _date_from_head(head.decode('big5', errors='ignore')) or _date_from_name(os.path.basename(path))
+    return market, date
+
+
+def scan_archive(directory, market=None):
+    """列出目錄（含子目錄）中可匯入的行情檔，回傳 [(路徑, 市場, 西元日期)]，依日期排序。"""
+    found = []
+    for dirpath, _, file_names in os.walk(directory):
+        for file_name in sorted(file_names):
+            if not file_name.lower().endswith('.csv'):
+                continue
+            path = os.path.join(dirpath, file_name)
+            file_market, date = detect(path, market)
+            if file_market is None or date is None:
+                print(f"略過無法辨識的檔案：{path}")
+                continue
+            found.append((path, file_market, date))
+    return sorted(found, key=lambda item: (item[1], item[2]))
+
+
+def parse_file(path, market, date, fields=QUOTE_FIELDS):
+    """在子行程中解析一個檔案，解析方式與 StockDataFetcher 的 _process_tse_quotes/_process_otc_quotes 相同。"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    payload = content.decode('big5', errors='ignore') if market == 'tse' else content
+    try:
+        df = parse_quotes(payload, market, fields)
+    except ValueError as e:
+        # 休市日的檔案沒有行情表，略過但不中斷整批匯入
+        print(f"略過 {path}：{str(e)}")
+        return pd.DataFrame(columns=list(fields), dtype='float64')
+    # 與抓取時相同的欄位名稱：上櫃為民國日期
+    df.attrs['date'] = f'{int(date[:4]) - 1911}/{date[4:6]}/{date[6:]}' if market == 'otc' else date
+    return df
+
+
+def import_archive(directory, market=None, root='store', fields=QUOTE_FIELDS, max_workers=None, overwrite=False):
+    """以行程池平行解析整個目錄的原始行情檔，再一次寫入各市場的 PriceStore，回傳 {市場: 匯入天數}。
+
+    已存在於 PriceStore 的交易日預設略過；同一天有多個檔案時使用排序後的最後一個。
+    """
+    files = {}
+    for path, file_market, date in scan_archive(directory, market):
+        files[(file_market, date)] = path
+    imported = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for file_market in sorted({key[0] for key in files}):
+            store = PriceStore(file_market, root)
+            jobs = [(path, date) for (m, date), path in sorted(files.items())
+                    if m == file_market and (overwrite or not store.has_date(date))]
+            print(f"{file_market} 找到 {sum(1 for m, _ in files if m == file_market)} 個檔案，待匯入 {len(jobs)} 個交易日")
+            if not jobs:
+                imported[file_market] = 0
+                continue
+            paths, dates = zip(*jobs)
+            results = executor.map(parse_file, paths, [file_market] * len(jobs), dates,
+                                   [tuple(fields)] * len(jobs), chunksize=max(1, len(jobs) // 64))
+            imported[file_market] = store.append_many(df for df in results if not df.empty)
+            print(f"{file_market} 已匯入 {imported[file_market]} 個交易日到 {store.dir}")
+    return imported
+
+
+# 使用示例
+if __name__ == "__main__":
+    import sys
+    import_archive(sys.argv[1] if len(sys.argv) > 1 else 'archive')
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+
+def to_western_date(date):
+    """將 'YYYYMMDD'、'YYYY-MM-DD' 或民國 '113/09/05' 格式的日期轉為 'YYYYMMDD'。"""
+    date = str(date).strip()
+    if '/' in date:
+        year, month, day = date.split('/')
+        year = int(year)
+        if year < 1911:
+            year += 1911
+        return f"{year:04d}{int(month):02d}{int(day):02d}"
+    return date.replace('-', '')[:8]
+
+
+# 收盤後的行情（含上櫃）在這個時刻前都已公布，之後抓取的內容才視為定稿
+FINAL_HOUR = 17
+
+
+class RawResponseCache:
+    """以 (市場, 交易日) 為鍵的原始回應快取。
+
+    每個交易日存成 <root>/<market>/<YYYYMMDD>.raw，旁邊的 .json 記錄 sha256、編碼與抓取時間。
+    在交易日當天 final_hour 點之後抓取的內容才是定稿、永不過期；更早抓取的（例如盤中或剛收盤時）
+    只保留 today_ttl 秒，即使日期已經過去也一樣，之後會重新下載。
+    """
+
+    def __init__(self, root='cache', today_ttl=600, final_hour=FINAL_HOUR):
+        self.root = root
+        self.today_ttl = today_ttl
+        self.final_hour = final_hour
+
+    def _paths(self, market, date):
+        base = os.path.join(self.root, market, to_western_date(date))
+        return base + '.raw', base + '.json'
+
+    def _is_final(self, date, fetched_at):
+        closed = datetime.strptime(to_western_date(date), '%Y%m%d') + timedelta(hours=self.final_hour)
+        return fetched_at >= closed.timestamp()
+
+    def get(self, market, date):
+        """讀取快取，回傳 (content, encoding)；沒有、過期或雜湊不符時回傳 None。"""
+        raw_path, meta_path = self._paths(market, date)
+        if not (os.path.exists(raw_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if not self._is_final(date, meta['fetched_at']) and time.time() - meta['fetched_at'] > self.today_ttl:
+            return None
+        with open(raw_path, 'rb') as f:
+            content = f.read()
+        if hashlib.sha256(content).hexdigest() != meta['sha256']:
+            print(f"警告：快取 {raw_path} 的雜湊不符，將重新下載")
+            return None
+        return content, meta.get('encoding')
+
+    def put(self, market, date, content, encoding=None):
+        """寫入原始內容；先寫暫存檔再 os.replace，避免留下寫到一半的檔案。"""
+        raw_path, meta_path = self._paths(market, date)
+        os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+        meta = {
+            'market': market,
+            'date': to_western_date(date),
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'size': len(content),
+            'encoding': encoding,
+            'fetched_at': time.time(),
+        }
+        with open(raw_path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(raw_path + '.tmp', raw_path)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def contains(self, market, date):
+        return self.get(market, date) is not None
+
+    def import_file(self, market, date, path, encoding=None):
+        """將已下載的原始檔（例如 data/RSTA3104_1130905.csv）放入快取。"""
+        with open(path, 'rb') as f:
+            self.put(market, date, f.read(), encoding)
+
+
+# 使用示例
+if __name__ == "__main__":
+    cache = RawResponseCache()
+    cache.import_file('otc', '113/09/05', os.path.join('data', 'RSTA3104_1130905.csv'), encoding='big5')
+    content, encoding = cache.get('otc', '113/09/05')
+    print(f"快取內容 {len(content)} bytes，編碼 {encoding}")
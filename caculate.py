@@ -1,10 +1,13 @@
 import pandas as pd
 import numpy as np
 import os
+from price_store import load_price_frame
+from returns import DEFAULT_HORIZONS, returns_frame, top_k, format_percent
+from metrics import metrics
 
-def calculate_and_sort_gains(input_file, output_file, sort_period='5天'):
-    # 讀取CSV文件
-    df = pd.read_csv(input_file, index_col=0)
+def calculate_and_sort_gains(input_file, output_file, sort_period='5天', horizons=DEFAULT_HORIZONS, top_n=None):
+    # 讀取CSV文件、PriceStore 或 DataFrame
+    df = load_price_frame(input_file)
     
     # 確保日期列是按照時間順序排列的
     df = df.sort_index(axis=1)
@@ -13,39 +16,39 @@ def calculate_and_sort_gains(input_file, output_file, sort_period='5天'):
     num_days = df.shape[1]
     print(f"數據包含 {num_days} 天的價格信息")
 
-    # 將所有價格數據轉換為浮點數
-    df = df.astype(float)
-
-    # 計算漲幅
-    gains_5d = (df.iloc[:, -1] - df.iloc[:, -min(5, num_days)]) / df.iloc[:, -min(5, num_days)] if num_days >= 5 else pd.Series(np.nan, index=df.index)
-    gains_10d = (df.iloc[:, -1] - df.iloc[:, -min(10, num_days)]) / df.iloc[:, -min(10, num_days)] if num_days >= 10 else pd.Series(np.nan, index=df.index)
-    gains_20d = (df.iloc[:, -1] - df.iloc[:, -min(20, num_days)]) / df.iloc[:, -min(20, num_days)] if num_days >= 20 else pd.Series(np.nan, index=df.index)
-    gains_total = (df.iloc[:, -1] - df.iloc[:, 0]) / df.iloc[:, 0]
+    # 一次計算所有期間的漲幅，保持數值型直到輸出
+    with metrics.stage('analytics'):
+        gains = returns_frame(df, horizons)
 
     # 打印一些調試信息
     print("\n總漲幅統計：")
-    print(gains_total.describe())
+    print(gains['總漲幅'].describe())
 
-    # 創建結果DataFrame
-    result_df = pd.DataFrame({
-        '股票代碼': df.index,
-        '5天漲幅': gains_5d.apply(lambda x: f'{x:.2%}' if pd.notnull(x) else 'N/A'),
-        '10天漲幅': gains_10d.apply(lambda x: f'{x:.2%}' if pd.notnull(x) else 'N/A'),
-        '20天漲幅': gains_20d.apply(lambda x: f'{x:.2%}' if pd.notnull(x) else 'N/A'),
-        '總漲幅': gains_total.apply(lambda x: f'{x:.2%}' if pd.notnull(x) else 'N/A')
-    })
-    
-    # 根據指定的天數進行排序
+    save_sorted_gains(gains, output_file, sort_period, top_n)
+    return gains
+
+def save_sorted_gains(gains, output_file, sort_period='5天', top_n=None):
+    # 根據指定的天數進行排序，top_n 只取前 N 名時使用部分排序
     sort_column = f'{sort_period}漲幅'
-    if sort_column in result_df.columns:
-        result_df[sort_column] = result_df[sort_column].apply(lambda x: float(x.rstrip('%'))/100 if x != 'N/A' else np.nan)
-        result_df = result_df.sort_values(by=sort_column, ascending=False)
-        result_df[sort_column] = result_df[sort_column].apply(lambda x: f'{x:.2%}' if pd.notnull(x) else 'N/A')
+    if sort_column in gains.columns:
+        values = gains[sort_column].to_numpy()
+        if top_n:
+            order = top_k(values, top_n)
+        else:
+            order = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind='stable')
+        gains = gains.iloc[order]
     else:
         print(f"警告：無法找到 '{sort_column}' 列進行排序。")
+
+    # 創建結果DataFrame
+    result_df = pd.DataFrame({'股票代碼': gains.index})
+    for column in gains.columns:
+        result_df[column] = format_percent(gains[column].to_numpy())
     
-    # 保存結果到CSV文件
-    result_df.to_csv(output_file, encoding='utf-8-sig', index=False)
+    # 先寫入暫存檔再替換，讀取中的程式不會看到寫到一半的檔案
+    tmp_file = f'{output_file}.tmp'
+    result_df.to_csv(tmp_file, encoding='utf-8-sig', index=False)
+    os.replace(tmp_file, output_file)
     
     print(f"漲幅計算和排序完成，結果已保存到 {output_file}")
 
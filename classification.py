@@ -0,0 +1,137 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 證券類別的代號規則（以正規表示式表達，整批向量化比對）
+PATTERNS = {
+    'four_digit': r'^.{4}$',                   # 原本 filter_four_digit_stocks 的條件
+    'common': r'^[1-9]\d{3}$',                 # 普通股，例如 2330
+    'etf': r'^00\d{2,4}[A-Z]?$',               # ETF，例如 0050、006201、00631L
+    'bond_etf': r'^00\d{2,4}B$',               # 債券 ETF，例如 00679B
+    'warrant': r'^(0[3-8]\d{3}|7\d{4})[0-9A-Z]$',  # 上市 03xxxx-08xxxx、上櫃 7xxxxx 權證（含 71234P 等後綴）
+    'preferred': r'^[1-9]\d{3}[A-Z]$',         # 特別股，例如 2881A
+}
+FLAGS = list(PATTERNS) + ['tse', 'otc']
+LEGACY_FILE = re.compile(r'^[0-9a-f]{16}\.npz$')
+
+
+def _market_flags(market, n):
+    markets = np.broadcast_to(np.asarray(market if market is not None else '', dtype=object), n)
+    return {'tse': markets == 'tse', 'otc': markets == 'otc'}
+
+
+def classify(symbols, market=None):
+    """計算每個代號的證券類別旗標，回傳布林 DataFrame（索引為代號）。"""
+    codes = pd.Index(symbols).astype(str).str.strip()
+    flags = {name: np.asarray(codes.str.match(pattern), dtype=bool) for name, pattern in PATTERNS.items()}
+    # 債券 ETF 也符合 ETF 的規則，這裡分開計算
+    flags['etf'] &= ~flags['bond_etf']
+    flags.update(_market_flags(market, len(codes)))
+    return pd.DataFrame(flags, index=pd.Index(symbols), columns=FLAGS)
+
+
+class SecurityClassifier:
+    """快取類別旗標：出現過的代號與其旗標存在單一檔案 <cache_dir>/flags.npz。
+
+    類別只由代號決定（市場旗標在查詢時才計算），新的代號表只需計算沒見過的代號再覆寫同一個檔案，
+    檔案大小以出現過的代號數為上限。read_only=True 時不寫入磁碟，供查詢服務、回測等唯讀路徑使用。
+    記憶體中以 LRU 保留最近 max_memory 份代號表的結果。
+    """
+
+    def __init__(self, cache_dir=os.path.join('store', 'classification'), read_only=False, max_memory=8):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, 'flags.npz')
+        self.read_only = read_only
+        self.max_memory = max_memory
+        self.memory = OrderedDict()
+        self.known = None  # 以代號為索引的 PATTERNS 旗標
+        self.loaded_mtime = None
+        self.lock = threading.Lock()
+
+    def _key(self, symbols, market):
+        digest = hashlib.sha256()
+        digest.update(str(market).encode())
+        for code in symbols:
+            digest.update(str(code).encode() + b'\0')
+        return digest.hexdigest()[:16]
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        mtime = os.path.getmtime(self.path)
+        if mtime == self.loaded_mtime:
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            self.known = pd.DataFrame({name: data[name] for name in PATTERNS},
+                                      index=pd.Index(data['symbols'].astype(object), dtype=object))
+        self.loaded_mtime = mtime
+
+    def _save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, symbols=self.known.index.to_numpy(dtype=str),
+                     **{name: self.known[name].to_numpy() for name in PATTERNS})
+        os.replace(tmp, self.path)
+        self.loaded_mtime = os.path.getmtime(self.path)
+        # 舊版每份代號表各寫一個 <雜湊>.npz，順便清掉
+        for file_name in os.listdir(self.cache_dir):
+            if LEGACY_FILE.match(file_name):
+                os.remove(os.path.join(self.cache_dir, file_name))
+
+    def _patterns(self, codes):
+        with self.lock:
+            self._load()
+            unique = codes.unique()
+            missing = unique if self.known is None else unique.difference(self.known.index)
+            if len(missing):
+                new = classify(missing)[list(PATTERNS)]
+                self.known = new if self.known is None else pd.concat([self.known, new])
+                if not self.read_only:
+                    self._save()
+            return self.known.reindex(codes)
+
+    def flags(self, symbols, market=None):
+        """回傳類別旗標（依輸入代號順序對齊）；market 可以是單一字串或逐一對應的陣列。"""
+        symbols = list(symbols)
+        key = self._key(symbols, market if isinstance(market, (str, type(None))) else tuple(market))
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+        patterns = self._patterns(pd.Index(symbols, dtype=object).astype(str))
+        columns = {name: patterns[name].to_numpy(dtype=bool) for name in PATTERNS}
+        columns.update(_market_flags(market, len(symbols)))
+        flags = pd.DataFrame(columns, index=pd.Index(symbols), columns=FLAGS)
+        with self.lock:
+            self.memory[key] = flags
+            while len(self.memory) > self.max_memory:
+                self.memory.popitem(last=False)
+        return flags
+
+    def mask(self, symbols, kinds=('common',), market=None):
+        """任一類別符合即為 True 的布林遮罩。"""
+        flags = self.flags(symbols, market)
+        return flags[list(kinds)].to_numpy().any(axis=1)
+
+
+_default = SecurityClassifier()
+
+
+def select(source, kinds=('common',), market=None, classifier=None):
+    """讀取時套用類別篩選，不產生 filtered_*.csv。source 可以是 DataFrame 或 PriceMatrix。"""
+    classifier = classifier or _default
+    if isinstance(source, pd.DataFrame):
+        return source[classifier.mask(source.index, kinds, market)]
+    return source.select(classifier.mask(source.symbols, kinds, market))
+
+
+# 使用示例
+if __name__ == "__main__":
+    print(classify(['2330', '0050', '006201', '00679B', '030001', '71234P', '2881A', '6488'], 'otc'))
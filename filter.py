@@ -1,18 +1,22 @@
 import pandas as pd
 import os
 from pathlib import Path
-def filter_four_digit_stocks(input_file, output_file):
-    # 讀取 CSV 文件
-    df = pd.read_csv(input_file, index_col=0)
-    
-    # 過濾出索引（股票代碼）為四個字元的行
-    filtered_df = df[df.index.str.len() == 4]
-    
-    # 保存過濾後的數據到新的 CSV 文件
-    filtered_df.to_csv(output_file, encoding='utf-8-sig')
+from price_store import load_price_frame
+from metrics import metrics
+def filter_four_digit_stocks(input_file, output_file=None):
+    with metrics.stage('filter'):
+        # 讀取 CSV 文件、PriceStore 或 DataFrame
+        df = load_price_frame(input_file)
+        
+        # 過濾出索引（股票代碼）為四個字元的行
+        filtered_df = df[df.index.astype(str).str.len() == 4]
     
     print(f"處理完成。原始文件有 {len(df)} 個股票，過濾後有 {len(filtered_df)} 個股票。")
-    print(f"結果已保存到 {output_file}")
+    if output_file:
+        # 保存過濾後的數據到新的 CSV 文件
+        filtered_df.to_csv(output_file, encoding='utf-8-sig')
+        print(f"結果已保存到 {output_file}")
+    return filtered_df
  
 # 使用示例
  
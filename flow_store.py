@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from cache import to_western_date
+from price_store import PriceStore
+from screening import FLOW_COLUMNS
+
+FLOW_FIELDS = tuple(FLOW_COLUMNS)  # ('foreign', 'trust', 'dealer')
+
+
+def parse_t86(df):
+    """把 T86 表格的千分位字串轉為整數股數，回傳以 FLOW_FIELDS 為欄、證券代號為索引的 DataFrame。"""
+    codes = df['證券代號'].astype(str).str.strip().str.lstrip('=').str.strip('"')
+    result = {}
+    for field, column in FLOW_COLUMNS.items():
+        if column in df.columns:
+            values = pd.to_numeric(df[column].astype(str).str.replace(',', '', regex=False), errors='coerce')
+            result[field] = values.fillna(0).to_numpy(dtype='int64')
+        else:
+            result[field] = np.zeros(len(df), dtype='int64')
+    parsed = pd.DataFrame(result, index=pd.Index(codes.to_numpy(), dtype=object, name='證券代號'))
+    return parsed[~parsed.index.duplicated(keep='last')]
+
+
+def rolling_sum(values, days):
+    """沿日期軸的 N 日合計（含當天），前 N-1 天為目前為止的合計。"""
+    cumulative = np.cumsum(values, axis=1)
+    if days < values.shape[1]:
+        cumulative[:, days:] = cumulative[:, days:] - cumulative[:, :-days]
+    return cumulative
+
+
+def buy_streak(values):
+    """每個日期為止連續買超（> 0）的天數，賣超或沒有資料的日期歸零。"""
+    buying = np.asarray(values) > 0
+    count = np.cumsum(buying, axis=1)
+    # 每個非買超日記下當時的累計數，往後扣掉即為連續天數
+    reset = np.maximum.accumulate(np.where(buying, 0, count), axis=1)
+    return count - reset
+
+
+class FlowStore(PriceStore):
+    """三大法人買賣超的每日分區儲存（<root>/flows/<YYYYMMDD>.npz）。
+
+    分區格式與 PriceStore 相同：證券代號加上 foreign、trust、dealer 三個 int64 股數陣列，
+    manifest 與指紋也共用，因此可以和收盤價一樣逐日增量更新。
+    """
+
+    integer_fields = FLOW_FIELDS
+
+    def __init__(self, root='store'):
+        super().__init__('flows', root)
+
+    def append_t86(self, df, date):
+        """寫入一天的 T86 表格（get_institutional_investors_data 的結果）。"""
+        parsed = parse_t86(df)
+        parsed.attrs['date'] = to_western_date(date)
+        self.append(parsed)
+        return parsed
+
+    def update(self, investors, start_date, end_date, calendar=None):
+        """只抓取尚未儲存的交易日；investors 為 InstitutionalInvestors，回傳新增的天數。"""
+        calendar = calendar or investors.calendar
+        if calendar:
+            date_range = calendar.trading_days(start_date, end_date, 'tse')
+        else:
+            date_range = pd.date_range(start=start_date, end=end_date, freq='B')
+        missing = [f"{date.year - 1911}/{date.month:02d}/{date.day:02d}" for date in date_range
+                   if not self.has_date(date.strftime('%Y%m%d'))]
+        if not missing:
+            return 0
+        frames = investors.get_institutional_investors_days(missing)
+        days = []
+        for date, df in sorted(frames.items(), key=lambda item: to_western_date(item[0])):
+            parsed = parse_t86(df)
+            parsed.attrs['date'] = to_western_date(date)
+            days.append(parsed)
+        added = self.append_many(days)
+        print(f"已新增 {added} 個交易日的三大法人買賣超到 {self.dir}")
+        return added
+
+    def aligned(self, field, symbols, dates):
+        """對齊到指定的代號與日期軸（例如 PriceMatrix 的 symbols、dates），回傳 (股票數, 日期數) 的 int64 股數陣列。
+
+        沒有資料的位置為 0；同時回傳布林陣列標示該日是否有法人資料。
+        """
+        symbols = pd.Index(symbols)
+        values = np.zeros((len(symbols), len(dates)), dtype='int64')
+        available = np.zeros(len(dates), dtype=bool)
+        for j, date in enumerate(dates):
+            date = to_western_date(date)
+            if not self.has_date(date):
+                continue
+            day = self.read_day(date, field)
+            rows = symbols.get_indexer(day.index)
+            found = rows >= 0
+            values[rows[found], j] = day.to_numpy()[found]
+            available[j] = True
+        return values, available
+
+    def aligned_to(self, matrix, field='foreign'):
+        """對齊到 PriceMatrix 的代號與日期軸。"""
+        return self.aligned(field, matrix.symbols, matrix.dates)
+
+    def flows(self, start_date=None, end_date=None):
+        """回傳 {'foreign'|'trust'|'dealer': 寬表（張）}，格式同 screening.flows_from_t86，可直接交給 Screener 或 Backtester。"""
+        result = {}
+        for field in FLOW_FIELDS:
+            df = self.read_matrix(start_date, end_date, field)
+            if not df.empty:
+                df.columns = [to_western_date(column) for column in df.columns]
+                result[field] = df / 1000
+        return result
+
+
+# 使用示例
+if __name__ == "__main__":
+    from price_matrix import PriceMatrix
+    from search_institutional_investors import InstitutionalInvestors
+    from trading_calendar import TradingCalendar
+    store = FlowStore()
+    store.update(InstitutionalInvestors(calendar=TradingCalendar()), '2024-07-01', '2024-09-06')
+    matrix = PriceMatrix.from_store(PriceStore('tse'))
+    foreign, _ = store.aligned_to(matrix, 'foreign')
+    # 外資 5 日買超張數與連續買超天數
+    print(pd.DataFrame({'外資5日買超張數': rolling_sum(foreign, 5)[:, -1] / 1000,
+                        '外資連續買超天數': buy_streak(foreign)[:, -1]}, index=matrix.symbols).nlargest(20, '外資5日買超張數'))
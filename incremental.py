@@ -0,0 +1,110 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from returns import DEFAULT_HORIZONS, first_valid, forward_fill, horizon_label
+
+
+class GainsState:
+    """增量漲幅計算的滾動狀態。
+
+    每檔股票只保留最長期間所需的最後幾天收盤價（已向前填補）以及第一筆有效收盤價，
+    新增一個交易日時以 O(股票數) 更新，不必重新讀取整個價格寬表。
+    """
+
+    def __init__(self, codes, window, first, dates, num_days, horizons=DEFAULT_HORIZONS, fingerprint=None):
+        self.codes = pd.Index(codes, dtype=object)
+        self.window = window        # (股票數, 最長期間) 的最後幾天收盤價
+        self.first = first          # 每檔股票第一筆有效收盤價
+        self.dates = list(dates)    # 已納入的交易日（西元 YYYYMMDD）
+        self.num_days = num_days
+        self.horizons = tuple(horizons)
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_matrix(cls, df, horizons=DEFAULT_HORIZONS, dates=None, fingerprint=None):
+        """由完整價格寬表建立狀態（全量重算）；未指定 dates 時依欄名排序。"""
+        if dates is None:
+            df = df.sort_index(axis=1)
+        values = df.to_numpy(dtype='float64', na_value=np.nan)
+        size = max(horizons)
+        window = np.full((len(df), size), np.nan)
+        tail = forward_fill(values)[:, -size:]
+        if tail.shape[1]:
+            window[:, -tail.shape[1]:] = tail
+        return cls(df.index.astype(str), window, first_valid(values),
+                   dates if dates is not None else list(df.columns), df.shape[1], horizons, fingerprint)
+
+    def append(self, series, date):
+        """加入新的一個交易日，新上市的股票會加在最後。"""
+        series = series[~series.index.duplicated(keep='last')]
+        new_codes = series.index.astype(str).difference(self.codes)
+        if len(new_codes):
+            self.codes = self.codes.append(pd.Index(new_codes, dtype=object))
+            self.window = np.vstack([self.window, np.full((len(new_codes), self.window.shape[1]), np.nan)])
+            self.first = np.concatenate([self.first, np.full(len(new_codes), np.nan)])
+        close = series.reindex(self.codes).to_numpy(dtype='float64', na_value=np.nan)
+        close = np.where(np.isnan(close), self.window[:, -1], close)
+        self.first = np.where(np.isnan(self.first), close, self.first)
+        self.window = np.roll(self.window, -1, axis=1)
+        self.window[:, -1] = close
+        self.dates.append(date)
+        self.num_days += 1
+
+    def gains(self):
+        """回傳與 returns_frame 相同格式的數值型漲幅表。"""
+        last = self.window[:, -1]
+        result = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for horizon in self.horizons:
+                if self.num_days >= horizon:
+                    base = self.window[:, -horizon]
+                    result[horizon_label(horizon)] = (last - base) / base
+                else:
+                    result[horizon_label(horizon)] = np.full(len(last), np.nan)
+            result['總漲幅'] = (last - self.first) / self.first
+        gains = pd.DataFrame(result, index=self.codes)
+        return gains.where(np.isfinite(gains))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        meta = {'dates': self.dates, 'num_days': self.num_days,
+                'horizons': list(self.horizons), 'fingerprint': self.fingerprint}
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, codes=np.asarray(self.codes, dtype=str), window=self.window,
+                     first=self.first, meta=np.array(json.dumps(meta)))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['codes'], data['window'], data['first'], meta['dates'],
+                       meta['num_days'], meta['horizons'], meta['fingerprint'])
+
+
+def incremental_gains(store, state_path=None, horizons=DEFAULT_HORIZONS):
+    """以增量方式更新 PriceStore 的漲幅；狀態不存在、期間設定改變或歷史被修改時改為全量重算。"""
+    state_path = state_path or os.path.join(store.dir, 'gains_state.npz')
+    dates = store.dates()
+    state = GainsState.load(state_path) if os.path.exists(state_path) else None
+
+    if state is not None:
+        consumed = len(state.dates)
+        if (tuple(state.horizons) != tuple(horizons) or dates[:consumed] != state.dates
+                or store.fingerprint(state.dates) != state.fingerprint):
+            print("歷史資料已變更，改為全量重算")
+            state = None
+        else:
+            for date in dates[consumed:]:
+                state.append(store.read_day(date), date)
+                print(f"已增量加入 {date}")
+
+    if state is None:
+        state = GainsState.from_matrix(store.read_matrix(), horizons, dates)
+
+    state.fingerprint = store.fingerprint(state.dates)
+    state.save(state_path)
+    return state.gains()
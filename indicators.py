@@ -0,0 +1,238 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from returns import forward_fill, format_percent
+
+DEFAULT_MA = (5, 20, 60)
+DEFAULT_RSI = 14
+DEFAULT_VOL = 20
+TRADING_DAYS = 252
+RSI_STATE = ('avg_gain', 'avg_loss', 'count', 'sum_gain', 'sum_loss')
+
+
+def moving_average(prices, window):
+    """所有股票同時計算簡單移動平均；停牌日沿用前一日收盤價，資料不足的位置為 NaN。"""
+    filled = forward_fill(prices)
+    result = np.full(filled.shape, np.nan)
+    if filled.shape[1] >= window:
+        result[:, window - 1:] = sliding_window_view(filled, window, axis=1).mean(axis=2)
+    return result
+
+
+def daily_returns(prices):
+    """以向前填補後的價格計算日報酬，停牌日報酬為 0，第一天為 NaN。"""
+    filled = forward_fill(prices)
+    result = np.full(filled.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[:, 1:] = filled[:, 1:] / filled[:, :-1] - 1
+    return result
+
+
+def rolling_volatility(prices, window=DEFAULT_VOL, annualize=True):
+    """日報酬的滾動標準差（年化）。"""
+    rets = daily_returns(prices)
+    result = np.full(rets.shape, np.nan)
+    if rets.shape[1] >= window:
+        windows = sliding_window_view(rets, window, axis=1)
+        with np.errstate(invalid='ignore'):
+            result[:, window - 1:] = np.std(windows, axis=2, ddof=1)
+    return result * np.sqrt(TRADING_DAYS) if annualize else result
+
+
+def rsi(prices, period=DEFAULT_RSI, state=None):
+    """Wilder RSI。沿時間軸逐日遞推，但每一步同時處理所有股票。
+
+    回傳 (RSI 矩陣, 遞推狀態)；狀態為 (平均漲幅, 平均跌幅, 已累積天數, 累積漲幅, 累積跌幅)，可用於增量更新。
+    """
+    filled = forward_fill(prices)
+    num_symbols, num_days = filled.shape
+    change = np.diff(filled, axis=1)
+    gains = np.where(change > 0, change, 0.0)
+    losses = np.where(change < 0, -change, 0.0)
+    valid = ~np.isnan(change)
+    result = np.full((num_symbols, num_days), np.nan)
+
+    if state is None:
+        avg_gain = np.full(num_symbols, np.nan)
+        avg_loss = np.full(num_symbols, np.nan)
+        count = np.zeros(num_symbols, dtype=int)
+        sum_gain = np.zeros(num_symbols)
+        sum_loss = np.zeros(num_symbols)
+    else:
+        avg_gain, avg_loss, count, sum_gain, sum_loss = (np.array(part) for part in state)
+
+    for t in range(change.shape[1]):
+        v = valid[:, t]
+        # 前 period 天先累加，滿 period 天後取平均作為起點
+        warming = v & (count < period)
+        sum_gain[warming] += gains[warming, t]
+        sum_loss[warming] += losses[warming, t]
+        count[warming] += 1
+        ready = warming & (count == period)
+        avg_gain[ready] = sum_gain[ready] / period
+        avg_loss[ready] = sum_loss[ready] / period
+        smooth = v & ~warming & (count >= period)
+        avg_gain[smooth] = (avg_gain[smooth] * (period - 1) + gains[smooth, t]) / period
+        avg_loss[smooth] = (avg_loss[smooth] * (period - 1) + losses[smooth, t]) / period
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[:, t + 1] = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+        result[count < period, t + 1] = np.nan
+    return result, (avg_gain, avg_loss, count, sum_gain, sum_loss)
+
+
+def drawdown(prices):
+    """目前回撤與歷史最大回撤（負值）。"""
+    filled = forward_fill(prices)
+    peak = np.fmax.accumulate(np.where(np.isnan(filled), -np.inf, filled), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        current = filled / peak - 1
+    current[~np.isfinite(current)] = np.nan
+    worst = np.fmin.accumulate(np.where(np.isnan(current), np.inf, current), axis=1)
+    worst[~np.isfinite(worst)] = np.nan
+    return current, worst
+
+
+def indicator_columns(ma_windows=DEFAULT_MA, rsi_period=DEFAULT_RSI, vol_window=DEFAULT_VOL):
+    return [f'MA{w}' for w in ma_windows] + [f'RSI{rsi_period}', f'{vol_window}天波動率', '回撤', '最大回撤']
+
+
+def compute_indicators(df, ma_windows=DEFAULT_MA, rsi_period=DEFAULT_RSI, vol_window=DEFAULT_VOL):
+    """對整個價格寬表計算最後一天的指標，回傳數值型 DataFrame（索引為股票代碼）。"""
+    df = df.sort_index(axis=1)
+    prices = df.to_numpy(dtype='float64', na_value=np.nan)
+    result = {}
+    for window in ma_windows:
+        result[f'MA{window}'] = moving_average(prices, window)[:, -1]
+    result[f'RSI{rsi_period}'] = rsi(prices, rsi_period)[0][:, -1]
+    result[f'{vol_window}天波動率'] = rolling_volatility(prices, vol_window)[:, -1]
+    current, worst = drawdown(prices)
+    result['回撤'] = current[:, -1]
+    result['最大回撤'] = worst[:, -1]
+    return pd.DataFrame(result, index=df.index, columns=indicator_columns(ma_windows, rsi_period, vol_window))
+
+
+def save_indicators(indicators, output_file):
+    """以與漲幅報表相同的格式輸出：第一欄為股票代碼，比率欄位以百分比字串呈現。"""
+    result_df = pd.DataFrame({'股票代碼': indicators.index})
+    for column in indicators.columns:
+        values = indicators[column].to_numpy()
+        if column.startswith('MA') or column.startswith('RSI'):
+            result_df[column] = np.where(np.isnan(values), 'N/A', np.char.mod('%.2f', np.nan_to_num(values)))
+        else:
+            result_df[column] = format_percent(values)
+    # 先寫暫存檔再替換，中斷時不會留下寫到一半的報表
+    result_df.to_csv(output_file + '.tmp', encoding='utf-8-sig', index=False)
+    os.replace(output_file + '.tmp', output_file)
+    print(f"技術指標計算完成，結果已保存到 {output_file}")
+
+
+class IndicatorState:
+    """指標的增量狀態：最後 N 天的價格、RSI 的平均漲跌幅、歷史高點與最大回撤。"""
+
+    def __init__(self, codes, window, rsi_state, peak, worst, num_days,
+                 ma_windows=DEFAULT_MA, rsi_period=DEFAULT_RSI, vol_window=DEFAULT_VOL):
+        self.codes = pd.Index(codes, dtype=object)
+        self.window = window
+        self.rsi_state = tuple(rsi_state)
+        self.peak = peak
+        self.worst = worst
+        self.num_days = num_days
+        self.ma_windows = tuple(ma_windows)
+        self.rsi_period = rsi_period
+        self.vol_window = vol_window
+
+    @classmethod
+    def from_matrix(cls, df, ma_windows=DEFAULT_MA, rsi_period=DEFAULT_RSI, vol_window=DEFAULT_VOL):
+        df = df.sort_index(axis=1)
+        prices = df.to_numpy(dtype='float64', na_value=np.nan)
+        size = max(max(ma_windows), vol_window + 1)
+        window = np.full((len(df), size), np.nan)
+        tail = forward_fill(prices)[:, -size:]
+        if tail.shape[1]:
+            window[:, -tail.shape[1]:] = tail
+        _, rsi_state = rsi(prices, rsi_period)
+        current, worst = drawdown(prices)
+        peak = np.fmax.reduce(np.where(np.isnan(prices), -np.inf, prices), axis=1) if prices.shape[1] else np.full(len(df), -np.inf)
+        return cls(df.index.astype(str), window, rsi_state, peak,
+                   worst[:, -1] if prices.shape[1] else np.full(len(df), np.nan),
+                   df.shape[1], ma_windows, rsi_period, vol_window)
+
+    def append(self, series):
+        """加入新的一個交易日，O(股票數 × 視窗長度)。"""
+        series = series[~series.index.duplicated(keep='last')]
+        new_codes = series.index.astype(str).difference(self.codes)
+        if len(new_codes):
+            n = len(new_codes)
+            self.codes = self.codes.append(pd.Index(new_codes, dtype=object))
+            self.window = np.vstack([self.window, np.full((n, self.window.shape[1]), np.nan)])
+            avg_gain, avg_loss, count, sum_gain, sum_loss = self.rsi_state
+            self.rsi_state = (np.concatenate([avg_gain, np.full(n, np.nan)]),
+                              np.concatenate([avg_loss, np.full(n, np.nan)]),
+                              np.concatenate([count, np.zeros(n, dtype=int)]),
+                              np.concatenate([sum_gain, np.zeros(n)]),
+                              np.concatenate([sum_loss, np.zeros(n)]))
+            self.peak = np.concatenate([self.peak, np.full(n, -np.inf)])
+            self.worst = np.concatenate([self.worst, np.full(n, np.nan)])
+        close = series.reindex(self.codes).to_numpy(dtype='float64', na_value=np.nan)
+        close = np.where(np.isnan(close), self.window[:, -1], close)
+        previous = self.window[:, -1]
+        _, self.rsi_state = rsi(np.column_stack([previous, close]), self.rsi_period, self.rsi_state)
+        self.window = np.roll(self.window, -1, axis=1)
+        self.window[:, -1] = close
+        self.peak = np.fmax(self.peak, np.where(np.isnan(close), -np.inf, close))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            current = close / self.peak - 1
+        current[~np.isfinite(current)] = np.nan
+        self.worst = np.fmin(self.worst, current)
+        self.num_days += 1
+
+    def indicators(self):
+        result = {}
+        for window in self.ma_windows:
+            values = self.window[:, -window:].mean(axis=1)
+            result[f'MA{window}'] = values if self.num_days >= window else np.full(len(values), np.nan)
+        avg_gain, avg_loss, count = self.rsi_state[:3]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+            values[count < self.rsi_period] = np.nan
+            result[f'RSI{self.rsi_period}'] = values
+            rets = self.window[:, 1:] / self.window[:, :-1] - 1
+        vol = np.std(rets[:, -self.vol_window:], axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+        result[f'{self.vol_window}天波動率'] = vol if self.num_days > self.vol_window else np.full(len(vol), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            current = self.window[:, -1] / self.peak - 1
+        current[~np.isfinite(current)] = np.nan
+        result['回撤'] = current
+        result['最大回撤'] = self.worst
+        return pd.DataFrame(result, index=self.codes,
+                            columns=indicator_columns(self.ma_windows, self.rsi_period, self.vol_window))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        meta = {'num_days': self.num_days, 'ma_windows': list(self.ma_windows),
+                'rsi_period': self.rsi_period, 'vol_window': self.vol_window}
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, codes=np.asarray(self.codes, dtype=str), window=self.window, peak=self.peak,
+                     worst=self.worst, meta=np.array(json.dumps(meta)),
+                     **{name: part for name, part in zip(RSI_STATE, self.rsi_state)})
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['codes'], data['window'], [data[name] for name in RSI_STATE], data['peak'],
+                       data['worst'], meta['num_days'], meta['ma_windows'], meta['rsi_period'], meta['vol_window'])
+
+
+# 使用示例
+if __name__ == "__main__":
+    from price_store import PriceStore
+    for market in ['otc', 'tse']:
+        store = PriceStore(market)
+        if store.exists():
+            save_indicators(compute_indicators(store.read_matrix()), os.path.join(market, 'stock_indicators.csv'))
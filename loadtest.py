@@ -0,0 +1,101 @@
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmark import _git_commit
+from metrics import metrics
+from mock_exchange import MockExchange
+from ratelimit import HostRateLimiter
+from retry_policy import RetryPolicy
+from seachprice import StockDataFetcher
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p99': None, 'max': None}
+    values = np.asarray(values)
+    return {'p50': float(np.percentile(values, 50)), 'p99': float(np.percentile(values, 99)), 'max': float(values.max())}
+
+
+def run_load_test(start_date='2024-07-01', end_date='2024-09-30', markets=('tse', 'otc'), max_workers=8, rate=None,
+                  capacity=4, retry_policy=None, **exchange_options):
+    """以模擬交易所量測 StockDataFetcher.get_stock_data 的吞吐量、延遲與重試成本，回傳可序列化成 JSON 的結果。
+
+    rate 為每秒請求數（None 表示不限速）；兩個端點都在同一個本機主機上，因此共用一個令牌桶。
+    exchange_options 直接交給 MockExchange，例如 latency=(0.05, 0.02)、error_rate=0.05、max_rate=20。
+    重試策略預設縮短退避與冷卻時間，讓一次測試在幾秒內跑完。
+    """
+    retry_policy = retry_policy or RetryPolicy(base_delay=0.05, max_delay=1.0, cooldown=1)
+    dates = pd.date_range(start=start_date, end=end_date, freq='B')
+    results = {}
+    with MockExchange(**exchange_options) as exchange:
+        for market in markets:
+            rate_limiter = HostRateLimiter(rate=rate, capacity=capacity) if rate else None
+            fetcher = StockDataFetcher(stock_type=market, max_workers=max_workers, rate_limiter=rate_limiter,
+                                       tse_url=exchange.tse_url, otc_url=exchange.otc_url)
+            fetcher.retry_policy = retry_policy
+            date_strs = [fetcher._format_date(date) for date in dates]
+            exchange.warm(market, date_strs)
+            first_fetch = len(metrics.fetches)
+
+            def timed(date_str):
+                start = time.perf_counter()
+                data = fetcher.get_stock_data(date_str, market)
+                return time.perf_counter() - start, len(data)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                timings = list(executor.map(timed, date_strs))
+            elapsed = time.perf_counter() - start
+
+            requests = metrics.fetches[first_fetch:]
+            fetched = sum(1 for _, rows in timings if rows)
+            decisions = Counter(f'{decision.error_class}:{decision.action}' for _, _, decision in fetcher.decisions)
+            results[market] = {
+                'days': len(date_strs),
+                'fetched_days': fetched,
+                'empty_days': len(date_strs) - fetched,
+                'seconds': elapsed,
+                'days_per_second': len(date_strs) / elapsed if elapsed else None,
+                'day_latency': _percentiles([seconds for seconds, _ in timings]),
+                'request_latency': _percentiles([fetch['latency'] for fetch in requests]),
+                'requests': len(requests),
+                # 每個交易日平均多送出的請求數
+                'retry_overhead': len(requests) / len(date_strs) - 1 if date_strs else None,
+                'errors': dict(Counter(fetch['error'] for fetch in requests if fetch['error'])),
+                'decisions': dict(decisions),
+            }
+        server_stats = dict(exchange.stats)
+
+    return {
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'params': {'start_date': start_date, 'end_date': end_date, 'markets': list(markets), 'max_workers': max_workers,
+                   'rate': rate, 'capacity': capacity,
+                   'exchange': {key: list(value) if isinstance(value, (tuple, set)) else value
+                                for key, value in exchange_options.items()}},
+        'server': server_stats,
+        'results': results,
+    }
+
+
+# 使用示例
+if __name__ == "__main__":
+    report = run_load_test(latency=(0.05, 0.02), error_rate=0.05, throttle_rate=0.02, truncate_rate=0.02,
+                           holidays=['20240717', '20240724', '20240725'])
+    for market, result in report['results'].items():
+        print(f"{market}: {result['days_per_second']:.1f} 天/秒，單日 p50 {result['day_latency']['p50'] * 1000:.0f} ms、"
+              f"p99 {result['day_latency']['p99'] * 1000:.0f} ms，重試額外請求 {result['retry_overhead']:.2%}")
+
+    output_dir = 'benchmarks'
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"loadtest_{report['commit'] or datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"壓力測試結果已保存到 {output_file}")
@@ -0,0 +1,131 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class RunMetrics:
+    """記錄每個市場、每個日期的抓取與處理耗時，輸出 JSON 與 Prometheus 文字格式的報告。
+
+    設定環境變數 PROFILE_STAGES（例如 'parse,analytics' 或 'all'）即可讓對應的階段在 cProfile 下執行，
+    統計檔會寫到 PROFILE_DIR（預設 profiles/）。
+    """
+
+    def __init__(self):
+        self.fetches = []
+        self.stages = []
+        self.lock = threading.Lock()
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.profile_stages = {s.strip() for s in os.environ.get('PROFILE_STAGES', '').split(',') if s.strip()}
+        self.profile_dir = os.environ.get('PROFILE_DIR', 'profiles')
+
+    def enable_profiling(self, stages=('all',), profile_dir='profiles'):
+        self.profile_stages = set(stages)
+        self.profile_dir = profile_dir
+
+    def record_fetch(self, market, date, latency, size=0, retries=0, error=None, status=None):
+        """記錄一次 HTTP 請求：延遲秒數、回應位元組數、第幾次重試與錯誤類別。"""
+        with self.lock:
+            self.fetches.append({'market': market, 'date': str(date), 'latency': latency, 'bytes': size,
+                                 'retries': retries, 'error': error, 'status': status})
+
+    def _profiled(self, name):
+        return 'all' in self.profile_stages or name in self.profile_stages
+
+    @contextmanager
+    def stage(self, name, market=None, date=None):
+        """量測一個階段（parse、merge、write、filter、analytics...）的耗時。"""
+        profiler = cProfile.Profile() if self._profiled(name) else None
+        start = time.perf_counter()
+        error = None
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                tag = '_'.join(str(part).replace('/', '') for part in (name, market, date) if part)
+                profiler.dump_stats(os.path.join(self.profile_dir, f'{tag}_{int(time.time() * 1000)}.prof'))
+            with self.lock:
+                self.stages.append({'stage': name, 'market': market, 'date': None if date is None else str(date),
+                                    'seconds': elapsed, 'error': error})
+
+    def summary(self):
+        """依市場彙整請求與階段耗時。"""
+        fetch = defaultdict(lambda: {'requests': 0, 'errors': defaultdict(int), 'retries': 0,
+                                     'bytes': 0, 'latency_sum': 0.0})
+        for item in self.fetches:
+            market = fetch[item['market']]
+            market['requests'] += 1
+            market['retries'] += 1 if item['retries'] else 0
+            market['bytes'] += item['bytes']
+            market['latency_sum'] += item['latency']
+            if item['error']:
+                market['errors'][item['error']] += 1
+        stages = defaultdict(lambda: {'count': 0, 'seconds': 0.0})
+        for item in self.stages:
+            key = (item['stage'], item['market'])
+            stages[key]['count'] += 1
+            stages[key]['seconds'] += item['seconds']
+        return fetch, stages
+
+    def to_dict(self):
+        fetch, stages = self.summary()
+        return {
+            'started_at': self.started_at,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'fetch_summary': {market: {**data, 'errors': dict(data['errors'])} for market, data in fetch.items()},
+            'stage_summary': [{'stage': stage, 'market': market, **data} for (stage, market), data in stages.items()],
+            'fetches': self.fetches,
+            'stages': self.stages,
+        }
+
+    def to_prometheus(self):
+        fetch, stages = self.summary()
+        lines = ['# HELP stock_fetch_requests_total HTTP requests sent to the exchange.',
+                 '# TYPE stock_fetch_requests_total counter']
+        lines += [f'stock_fetch_requests_total{{market="{m}"}} {d["requests"]}' for m, d in fetch.items()]
+        lines += ['# HELP stock_fetch_retries_total Requests that were retries.',
+                  '# TYPE stock_fetch_retries_total counter']
+        lines += [f'stock_fetch_retries_total{{market="{m}"}} {d["retries"]}' for m, d in fetch.items()]
+        lines += ['# HELP stock_fetch_errors_total Failed requests by error class.',
+                  '# TYPE stock_fetch_errors_total counter']
+        lines += [f'stock_fetch_errors_total{{market="{m}",error="{e}"}} {n}'
+                  for m, d in fetch.items() for e, n in d['errors'].items()]
+        lines += ['# HELP stock_fetch_response_bytes_total Response body bytes received.',
+                  '# TYPE stock_fetch_response_bytes_total counter']
+        lines += [f'stock_fetch_response_bytes_total{{market="{m}"}} {d["bytes"]}' for m, d in fetch.items()]
+        lines += ['# HELP stock_fetch_latency_seconds Request latency.',
+                  '# TYPE stock_fetch_latency_seconds summary']
+        for m, d in fetch.items():
+            lines.append(f'stock_fetch_latency_seconds_sum{{market="{m}"}} {d["latency_sum"]:.6f}')
+            lines.append(f'stock_fetch_latency_seconds_count{{market="{m}"}} {d["requests"]}')
+        lines += ['# HELP stock_stage_seconds Time spent in each processing stage.',
+                  '# TYPE stock_stage_seconds summary']
+        for (stage, market), d in stages.items():
+            labels = f'stage="{stage}",market="{market or ""}"'
+            lines.append(f'stock_stage_seconds_sum{{{labels}}} {d["seconds"]:.6f}')
+            lines.append(f'stock_stage_seconds_count{{{labels}}} {d["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, json_path='run_report.json', prom_path='run_report.prom'):
+        os.makedirs(os.path.dirname(json_path) or '.', exist_ok=True)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        with open(prom_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        print(f"執行報告已保存到 {json_path} 與 {prom_path}")
+
+
+# 整個行程共用的記錄器
+metrics = RunMetrics()
@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from cache import RawResponseCache, to_western_date
+from synthetic import make_otc_payload, make_tse_csv
+
+TSE_PATH = '/exchangeReport/MI_INDEX'
+OTC_PATH = '/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php'
+# 休市日：伺服器正常回應但沒有行情表
+NO_DATA_BODY = '很抱歉，沒有符合條件的資料!'.encode('big5')
+# 請求過於頻繁時交易所回傳的封鎖頁面
+BLOCK_PAGE = b'<!DOCTYPE html><html><body>Too many requests. Please try again later.</body></html>'
+
+
+class MockExchange:
+    """模擬 TWSE MI_INDEX CSV 與 TPEx stk_quote_download.php Big5 端點的本機伺服器。
+
+    行情內容來自 synthetic.py（依日期固定亂數種子）或 recorded_dir 中以 RawResponseCache 格式錄下的原始回應。
+    可注入的狀況（機率皆為 0~1）：
+    - latency：每個請求的延遲秒數 (平均, 抖動)
+    - holidays：沒有行情表的日期（週末一律視為休市）
+    - error_rate：HTTP 503
+    - throttle_rate：HTTP 429；max_rate 為每秒可接受的請求數，超過時回傳封鎖頁面
+    - truncate_rate：宣告完整的 Content-Length 但只送出一半內容後斷線
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, tse_symbols=1500, otc_symbols=12000, latency=(0.0, 0.0),
+                 holidays=(), error_rate=0.0, throttle_rate=0.0, max_rate=None, truncate_rate=0.0,
+                 recorded_dir=None, seed=0):
+        self.host = host
+        self.port = port
+        self.tse_symbols = tse_symbols
+        self.otc_symbols = otc_symbols
+        self.latency = latency
+        self.holidays = {to_western_date(date) for date in holidays}
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rate = max_rate
+        self.truncate_rate = truncate_rate
+        self.recorded = RawResponseCache(recorded_dir) if recorded_dir else None
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.payloads = {}
+        self.recent = deque()
+        self.stats = Counter()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def tse_url(self):
+        return self.base_url + TSE_PATH
+
+    @property
+    def otc_url(self):
+        return self.base_url + OTC_PATH
+
+    def start(self):
+        handler = type('Handler', (MockExchangeHandler,), {'exchange': self})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def payload(self, market, date):
+        """某市場某日的回應內容（Big5 位元組），休市日回傳 None。"""
+        if pd.Timestamp(date).weekday() >= 5 or date in self.holidays:
+            return None
+        key = (market, date)
+        with self.lock:
+            if key in self.payloads:
+                return self.payloads[key]
+        content = None
+        if self.recorded:
+            cached = self.recorded.get(market, date)
+            content = cached[0] if cached else None
+        if content is None:
+            seed = int(date)
+            if market == 'tse':
+                content = make_tse_csv(self.tse_symbols, date, seed).encode('big5')
+            else:
+                content = make_otc_payload(self.otc_symbols, f'{int(date[:4]) - 1911}{date[4:]}', seed)
+        with self.lock:
+            self.payloads[key] = content
+        return content
+
+    def warm(self, market, dates):
+        """預先產生各日期的回應內容，避免產生合成資料的時間被算進請求延遲。"""
+        for date in dates:
+            self.payload(market, to_western_date(date))
+
+    def decide(self):
+        """依設定的機率與速率上限決定這次要注入的狀況。"""
+        with self.lock:
+            now = time.monotonic()
+            self.recent.append(now)
+            while self.recent and self.recent[0] < now - 1:
+                self.recent.popleft()
+            if self.max_rate is not None and len(self.recent) > self.max_rate:
+                return 'blocked'
+            draw = self.random.random()
+            for outcome, rate in (('error', self.error_rate), ('throttled', self.throttle_rate),
+                                  ('truncated', self.truncate_rate)):
+                if draw < rate:
+                    return outcome
+                draw -= rate
+            return 'ok'
+
+    def delay(self):
+        mean, jitter = self.latency
+        with self.lock:
+            value = mean + self.random.uniform(-jitter, jitter) if jitter else mean
+        if value > 0:
+            time.sleep(value)
+
+
+class MockExchangeHandler(BaseHTTPRequestHandler):
+    exchange = None
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == TSE_PATH and 'date' in params:
+            market, date = 'tse', to_western_date(params['date'])
+        elif url.path == OTC_PATH and 'd' in params:
+            market, date = 'otc', to_western_date(params['d'])
+        else:
+            self._send(404, b'not found', 'text/plain')
+            return
+
+        exchange = self.exchange
+        exchange.delay()
+        outcome = exchange.decide()
+        content = exchange.payload(market, date) if outcome in ('ok', 'truncated') else None
+        if outcome == 'ok' and content is None:
+            outcome = 'holiday'
+        with exchange.lock:
+            exchange.stats[outcome] += 1
+            exchange.stats[f'{market}_requests'] += 1
+
+        if outcome == 'error':
+            self._send(503, b'Service Unavailable', 'text/plain')
+        elif outcome == 'throttled':
+            self._send(429, b'Too Many Requests', 'text/plain')
+        elif outcome == 'blocked':
+            self._send(200, BLOCK_PAGE, 'text/html')
+        elif outcome == 'holiday' or content is None:
+            self._send(200, NO_DATA_BODY, 'text/csv; charset=big5')
+        elif outcome == 'truncated':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv; charset=big5')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content[:len(content) // 2])
+            self.close_connection = True
+        else:
+            self._send(200, content, 'text/csv; charset=big5')
+
+    def _send(self, status, content, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# 使用示例
+if __name__ == "__main__":
+    with MockExchange(port=8060, latency=(0.05, 0.02), error_rate=0.05, throttle_rate=0.02, truncate_rate=0.02) as exchange:
+        print(f"模擬交易所：{exchange.tse_url}、{exchange.otc_url}（Ctrl-C 結束）")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -7,11 +7,14 @@ import random
 from tqdm import tqdm
 import csv
 
-def get_stock_data(date, session, type):
+TSE_URL = 'https://www.twse.com.tw/exchangeReport/MI_INDEX'
+OTC_URL = 'https://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php'
+
+def get_stock_data(date, session, type, tse_url=TSE_URL, otc_url=OTC_URL):
     if type == 'tse':
-        url = f'https://www.twse.com.tw/exchangeReport/MI_INDEX?response=csv&date={date}&type=ALL'
+        url = f'{tse_url}?response=csv&date={date}&type=ALL'
     else:
-        url = f'https://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php?l=zh-tw&d={date}&s=0,asc,0'
+        url = f'{otc_url}?l=zh-tw&d={date}&s=0,asc,0'
 
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -103,8 +106,8 @@ def add_historical_prices(csv_file, start_date, end_date, add_to='end'):
         print(f"數據已保存到 {csv_file}")
     else:
         print("沒有獲取到新的數據")
-def get_otc_stock_data(date, session):
-    url = f'https://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php?l=zh-tw&d={date}&s=0,asc,0'
+def get_otc_stock_data(date, session, otc_url=OTC_URL):
+    url = f'{otc_url}?l=zh-tw&d={date}&s=0,asc,0'
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
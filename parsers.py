@@ -0,0 +1,100 @@
+import io
+import os
+import time
+
+import pandas as pd
+
+# 解析速度目標（每秒處理的行情列數），以 data/RSTA3104_1130905.csv 量測
+TARGET_ROWS_PER_SEC = 200_000
+
+OTC_HEADER = '代號,'.encode('big5')
+
+# 行情欄位的標準名稱，以及各市場原始表頭中對應的欄位
+QUOTE_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'turnover', 'trades', 'bid', 'ask')
+TSE_COLUMNS = {'open': '開盤價', 'high': '最高價', 'low': '最低價', 'close': '收盤價', 'volume': '成交股數',
+               'turnover': '成交金額', 'trades': '成交筆數', 'bid': '最後揭示買價', 'ask': '最後揭示賣價'}
+OTC_COLUMNS = {'open': '開盤', 'high': '最高', 'low': '最低', 'close': '收盤', 'volume': '成交股數',
+               'turnover': '成交金額(元)', 'trades': '成交筆數', 'bid': '最後買價', 'ask': '最後賣價'}
+
+
+def _clean_numeric(values):
+    """向量化地去除千分位逗號，'--'、'---' 等無成交標記轉為 NaN。"""
+    return pd.to_numeric(values.str.replace(',', '', regex=False), errors='coerce')
+
+
+def parse_tse_quotes(text, fields=('收盤價',)):
+    """解析 TWSE MI_INDEX CSV：直接定位到 '證券代號' 表頭，跳過前面的指數區塊。"""
+    pos = text.find('證券代號')
+    if pos < 0:
+        raise ValueError("找不到 '證券代號' 表頭（可能是休市日）")
+    buffer = io.StringIO(text)
+    buffer.seek(text.rfind('\n', 0, pos) + 1)
+    df = pd.read_csv(buffer, usecols=['證券代號', *fields], dtype=str)
+    # 表尾的備註列沒有收盤價欄位
+    df = df.dropna(subset=['證券代號', fields[0]])
+    # 部分檔案的代號寫成 ="0050"
+    df['證券代號'] = df['證券代號'].str.lstrip('=').str.strip('"').str.strip()
+    df = df.set_index('證券代號')
+    for field in fields:
+        df[field] = _clean_numeric(df[field])
+    return df
+
+
+def parse_otc_quotes(content, fields=('收盤',)):
+    """解析 TPEx Big5 行情檔：以位元組定位 '代號' 表頭，由 C 解析器一次解碼。"""
+    pos = content.find(OTC_HEADER)
+    if pos < 0:
+        raise ValueError("找不到 '代號' 表頭（可能是休市日）")
+    buffer = io.BytesIO(content)
+    buffer.seek(pos)
+    wanted = {'代號', *fields}
+    df = pd.read_csv(buffer, encoding='big5', encoding_errors='ignore', dtype=str,
+                     usecols=lambda column: column.strip() in wanted)
+    df.columns = [column.strip() for column in df.columns]
+    # 表尾的統計列（例如 "上櫃家數","827"）欄位不足，收盤欄會是空值
+    df = df.dropna(subset=['代號', fields[0]])
+    df = df.drop_duplicates(subset='代號', keep='last').set_index('代號')
+    for field in fields:
+        df[field] = _clean_numeric(df[field])
+    return df
+
+
+def parse_quotes(payload, market, fields=QUOTE_FIELDS):
+    """一次解析整列行情，回傳以標準欄位名稱（QUOTE_FIELDS）為欄的 DataFrame，索引為證券代號。
+
+    payload 對上市為已解碼的文字、對上櫃為原始位元組。
+    """
+    columns = TSE_COLUMNS if market == 'tse' else OTC_COLUMNS
+    parse = parse_tse_quotes if market == 'tse' else parse_otc_quotes
+    # 收盤價放在第一個，解析函式以它排除表尾的備註列
+    wanted = ['close', *(field for field in fields if field != 'close')]
+    df = parse(payload, tuple(columns[field] for field in wanted))
+    # read_csv 依檔案中的欄位順序回傳，需以名稱對應
+    df = df.rename(columns={columns[field]: field for field in wanted})
+    return df[list(fields)]
+
+
+def measure_throughput(path, market='otc', repeat=5, fields=None):
+    """量測解析速度，回傳每秒處理的列數；fields 為 None 時只解析收盤價。"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    payload = content.decode('big5', errors='ignore') if market == 'tse' else content
+    if fields is None:
+        parse = parse_tse_quotes if market == 'tse' else parse_otc_quotes
+    else:
+        def parse(data):
+            return parse_quotes(data, market, fields)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = len(parse(payload))
+    elapsed = time.perf_counter() - start
+    return rows * repeat / elapsed
+
+
+# 使用示例
+if __name__ == "__main__":
+    rate = measure_throughput(os.path.join('data', 'RSTA3104_1130905.csv'), 'otc')
+    status = '達標' if rate >= TARGET_ROWS_PER_SEC else '未達標'
+    print(f"上櫃行情解析速度：{rate:,.0f} 列/秒（目標 {TARGET_ROWS_PER_SEC:,} 列/秒，{status}）")
+    rate = measure_throughput(os.path.join('data', 'RSTA3104_1130905.csv'), 'otc', fields=QUOTE_FIELDS)
+    print(f"上櫃完整行情（{len(QUOTE_FIELDS)} 個欄位）解析速度：{rate:,.0f} 列/秒")
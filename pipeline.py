@@ -0,0 +1,120 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from caculate import save_sorted_gains
+from classification import select
+from incremental import incremental_gains
+from metrics import metrics
+from price_store import PriceStore
+from seachprice import StockDataFetcher
+from trading_calendar import TradingCalendar
+
+MARKETS = ('otc', 'tse')
+DEFAULT_START = '2024-07-01'
+
+
+class StageManifest:
+    """記錄每個市場已完成的階段與其輸入指紋，輸入沒變且輸出仍存在的階段不會重跑。"""
+
+    def __init__(self, market):
+        self.path = os.path.join(market, 'pipeline_manifest.json')
+        self.stages = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.stages = json.load(f)
+
+    def is_fresh(self, stage, fingerprint):
+        record = self.stages.get(stage)
+        return bool(record) and record['input'] == fingerprint and os.path.exists(record['output'])
+
+    def record(self, stage, fingerprint, output, elapsed):
+        self.stages[stage] = {'input': fingerprint, 'output': str(output), 'seconds': round(elapsed, 3),
+                              'finished_at': datetime.now().isoformat(timespec='seconds')}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.stages, f, ensure_ascii=False, indent=1)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def fetch_stage(market, end_date, max_workers=1):
+    """抓取 PriceStore 第一天到 end_date 之間所有缺少的交易日，逐日寫入分區。
+
+    不只從最後一天往後抓：先前暫時失敗而留下的空洞也會在之後的執行中補上。
+    """
+    store = PriceStore(market)
+    dates = store.dates()
+    start_date = pd.Timestamp(dates[0]) if dates else pd.Timestamp(DEFAULT_START)
+    calendar = TradingCalendar()
+    missing = [day for day in calendar.trading_days(start_date, end_date, market)
+               if not store.has_date(day.strftime('%Y%m%d'))]
+    if not missing:
+        print(f"{market} 已是最新資料（{dates[-1] if dates else '無'}）")
+        return store
+    print(f"{market} 缺少 {len(missing)} 個交易日：{missing[0]:%Y%m%d} ~ {missing[-1]:%Y%m%d}")
+    fetcher = StockDataFetcher(missing[0], missing[-1], market, calendar=calendar)
+    fetcher.set_cache()
+    fetcher.set_fields()  # 完整行情一次存下，日後需要其他欄位時不必重抓
+    if max_workers > 1:
+        fetcher.set_concurrency(max_workers)
+    return fetcher.append_to_store(store, missing_only=True)
+
+
+def run_market(market, end_date, day=5, max_workers=1, kinds=('four_digit',)):
+    """在獨立的行程中依序執行單一市場的 fetch → filter → gains，回傳各階段耗時。
+
+    filter 是讀取時套用的類別遮罩（kinds，見 classification.py），不再寫出 filtered_*.csv。
+    """
+    os.makedirs(market, exist_ok=True)
+    manifest = StageManifest(market)
+    timings = {}
+
+    start = time.perf_counter()
+    store = fetch_stage(market, end_date, max_workers)
+    timings['fetch'] = time.perf_counter() - start
+    if not store.exists():
+        raise RuntimeError(f"{store.dir} 沒有任何價格分區")
+    fingerprint = store.fingerprint(store.dates())
+
+    rate_file = os.path.join(market, f'stock_gains_5d_10d_20d_{day}_sorted.csv')
+    gains_key = f"{fingerprint}:{day}:{','.join(kinds)}"
+    if manifest.is_fresh('gains', gains_key):
+        print(f"{market} gains 階段已是最新，略過")
+    else:
+        start = time.perf_counter()
+        with metrics.stage('analytics', market):
+            gains = select(incremental_gains(store), kinds, market)
+        save_sorted_gains(gains, rate_file, sort_period=f'{day}天')
+        timings['gains'] = time.perf_counter() - start
+        manifest.record('gains', gains_key, rate_file, timings['gains'])
+    metrics.write_report(os.path.join(market, 'run_report.json'), os.path.join(market, 'run_report.prom'))
+    return timings
+
+
+def run_pipeline(end_date=None, day=5, markets=MARKETS, max_workers=1):
+    """每個市場各用一個行程平行執行，總耗時接近較慢的那個市場。"""
+    end_date = end_date or datetime.now().strftime('%Y-%m-%d')
+    start = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=len(markets)) as executor:
+        futures = {market: executor.submit(run_market, market, end_date, day, max_workers) for market in markets}
+        for market, future in futures.items():
+            try:
+                timings = future.result()
+                summary = '，'.join(f'{stage} {seconds:.1f}s' for stage, seconds in timings.items())
+                print(f"{market} 完成：{summary}")
+            except Exception as e:
+                print(f"處理 {market} 市場時發生錯誤：{type(e).__name__}: {str(e)}")
+                failed.append(market)
+    print(f"總耗時 {time.perf_counter() - start:.1f} 秒")
+    return failed
+
+
+if __name__ == "__main__":
+    day = 5
+    failed = run_pipeline(day=day)
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,106 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import to_western_date
+
+
+class PriceMatrix:
+    """精簡的收盤價矩陣：float32 數值區塊 + 證券代號表 + 日期軸。
+
+    values.npy 以 (股票數, 交易日數) 的 float32 C-order 陣列儲存，載入時使用記憶體映射，不複製資料；
+    symbols.json 把 '006201'、'00679B' 等代號對應到列號，dates.json 記錄西元日期與原始欄名。
+    """
+
+    def __init__(self, values, symbols, dates, labels=None):
+        self.values = values
+        self.symbols = list(symbols)
+        self.dates = list(dates)
+        self.labels = list(labels) if labels is not None else list(self.dates)
+        self._ids = None
+
+    @property
+    def symbol_ids(self):
+        """代號到列號的對照表，第一次使用時才建立。"""
+        if self._ids is None:
+            self._ids = {code: i for i, code in enumerate(self.symbols)}
+        return self._ids
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @classmethod
+    def from_frame(cls, df, dtype='float32'):
+        """由舊的寬表 DataFrame（列為代號、欄為日期）建立。"""
+        labels = [str(column) for column in df.columns]
+        values = np.ascontiguousarray(df.to_numpy(dtype=dtype, na_value=np.nan))
+        return cls(values, df.index.astype(str), [to_western_date(label) for label in labels], labels)
+
+    @classmethod
+    def from_store(cls, store, start_date=None, end_date=None, field='close'):
+        return cls.from_frame(store.read_matrix(start_date, end_date, field))
+
+    def to_frame(self):
+        """轉回寬表 DataFrame，數值區塊直接共用、不複製。"""
+        return pd.DataFrame(self.values, index=pd.Index(self.symbols, name='證券代號'), columns=self.labels, copy=False)
+
+    def save(self, path):
+        """寫入目錄；每個檔案先寫暫存檔再 os.replace。"""
+        os.makedirs(path, exist_ok=True)
+        values_path = os.path.join(path, 'values.npy')
+        with open(values_path + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.values, dtype='float32'))
+        os.replace(values_path + '.tmp', values_path)
+        for name, data in (('symbols.json', self.symbols), ('dates.json', {'dates': self.dates, 'labels': self.labels})):
+            file_path = os.path.join(path, name)
+            with open(file_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(file_path + '.tmp', file_path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """載入目錄；mmap 為 True 時數值區塊以唯讀記憶體映射開啟。"""
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r' if mmap else None)
+        with open(os.path.join(path, 'symbols.json'), 'r', encoding='utf-8') as f:
+            symbols = json.load(f)
+        with open(os.path.join(path, 'dates.json'), 'r', encoding='utf-8') as f:
+            dates = json.load(f)
+        return cls(values, symbols, dates['dates'], dates['labels'])
+
+    def window(self, start_date=None, end_date=None):
+        """回傳日期區間的子矩陣，數值區塊是原陣列的切片（view），不配置新記憶體。"""
+        start = np.searchsorted(self.dates, to_western_date(start_date)) if start_date else 0
+        end = np.searchsorted(self.dates, to_western_date(end_date), side='right') if end_date else len(self.dates)
+        matrix = PriceMatrix(self.values[:, start:end], self.symbols, self.dates[start:end], self.labels[start:end])
+        matrix._ids = self._ids
+        return matrix
+
+    def row(self, code):
+        """單一股票的收盤價序列（view）。"""
+        return self.values[self.symbol_ids[code]]
+
+    def rows(self, codes):
+        """多檔股票的子矩陣，依 codes 順序；不存在的代號會被略過。"""
+        codes = [code for code in codes if code in self.symbol_ids]
+        ids = np.fromiter((self.symbol_ids[code] for code in codes), dtype=np.intp, count=len(codes))
+        matrix = PriceMatrix(self.values[ids], codes, self.dates, self.labels)
+        return matrix
+
+    def select(self, mask):
+        """以布林遮罩選取股票。"""
+        mask = np.asarray(mask, dtype=bool)
+        return PriceMatrix(self.values[mask], np.asarray(self.symbols, dtype=object)[mask], self.dates, self.labels)
+
+
+# 使用示例
+if __name__ == "__main__":
+    from price_store import PriceStore
+    for market in ['otc', 'tse']:
+        store = PriceStore(market)
+        if store.exists():
+            PriceMatrix.from_store(store).save(os.path.join('store', market, 'matrix'))
+            matrix = PriceMatrix.load(os.path.join('store', market, 'matrix'))
+            print(f"{market}: {matrix.shape[0]} 檔股票 × {matrix.shape[1]} 個交易日")
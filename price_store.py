@@ -0,0 +1,190 @@
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import to_western_date
+
+
+class PriceStore:
+    """以交易日分區的行情儲存庫。
+
+    每個交易日一個 <root>/<market>/<YYYYMMDD>.npz 分區，內含證券代號與各行情欄位（close、open、volume……，
+    見 parsers.QUOTE_FIELDS）各一個陣列；manifest.json 記錄所有分區、已存的欄位與原始欄位名稱（上櫃為民國日期）。
+    npz 中的每個陣列是獨立、未壓縮的 zip 成員，讀取時只載入用到的欄位，只用收盤價的程式不必讀取其他欄位。
+    新增一天只需寫入一個分區並以 os.replace 原子地更新 manifest，不必重寫整個寬表。
+    """
+
+    integer_fields = ()  # 以 int64 儲存的欄位（缺值為 0）；其他欄位一律為 float64、缺值為 NaN
+
+    def __init__(self, market, root='store'):
+        self.market = market
+        self.root = root
+        self.dir = os.path.join(root, market)
+        self.manifest_path = os.path.join(self.dir, 'manifest.json')
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'market': self.market, 'partitions': {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def exists(self):
+        return bool(self.manifest['partitions'])
+
+    def dates(self, start_date=None, end_date=None):
+        """回傳區間內已儲存的交易日（西元 YYYYMMDD，已排序）。"""
+        start = to_western_date(start_date) if start_date else '00000000'
+        end = to_western_date(end_date) if end_date else '99999999'
+        return sorted(d for d in self.manifest['partitions'] if start <= d <= end)
+
+    def has_date(self, date):
+        return to_western_date(date) in self.manifest['partitions']
+
+    def append(self, data, date=None):
+        """寫入一個交易日的行情。
+
+        data 可以是收盤價 Series（索引為證券代號，名稱為日期），或以欄位名稱為欄的 DataFrame
+        （例如 StockDataFetcher.get_daily_quotes 的結果，日期放在 attrs['date']）。
+        """
+        self._write_partition(data, date)
+        self._save_manifest()
+        self._sync_index()
+
+    def append_many(self, days):
+        """寫入多個交易日（元素格式同 append），全部分區寫完後才更新一次 manifest，回傳寫入的天數。"""
+        count = 0
+        try:
+            for data in days:
+                self._write_partition(data)
+                count += 1
+        finally:
+            # 中途失敗時，已寫完的分區仍記錄到 manifest
+            if count:
+                self._save_manifest()
+                self._sync_index()
+        return count
+
+    def _sync_index(self):
+        """已建立單股索引（symbol_index.SymbolIndex）時，寫入分區後一併更新。"""
+        from symbol_index import SymbolIndex
+        index = SymbolIndex(self.market, self.root)
+        if index.exists():
+            index.sync(self)
+
+    def _write_partition(self, data, date=None):
+        if isinstance(data, pd.Series):
+            label = str(date if date is not None else data.name)
+            data = data.to_frame('close')
+        else:
+            label = str(date if date is not None else data.attrs['date'])
+        key = to_western_date(label)
+        os.makedirs(self.dir, exist_ok=True)
+        file_name = f'{key}.npz'
+        path = os.path.join(self.dir, file_name)
+        fields = [str(field) for field in data.columns]
+        buffer = io.BytesIO()
+        np.savez(buffer, codes=np.asarray(data.index.astype(str), dtype=str),
+                 **{field: _column(data[field], field in self.integer_fields) for field in fields})
+        content = buffer.getvalue()
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+        self.manifest['partitions'][key] = {'file': file_name, 'label': label, 'rows': int(len(data)),
+                                            'fields': fields, 'sha256': hashlib.sha256(content).hexdigest()}
+
+    def fields(self, date=None):
+        """某一天（或任何一天）已儲存的欄位；舊的分區只有 close。"""
+        partitions = [self.manifest['partitions'][to_western_date(date)]] if date else self.manifest['partitions'].values()
+        found = {}
+        for info in partitions:
+            found.update(dict.fromkeys(info.get('fields', ['close'])))
+        return list(found)
+
+    def fingerprint(self, dates):
+        """由指定交易日分區的雜湊組成指紋，用來判斷歷史資料是否被修改過。"""
+        digest = hashlib.sha256()
+        for date in dates:
+            info = self.manifest['partitions'].get(to_western_date(date), {})
+            digest.update(f"{date}:{info.get('sha256', '')};".encode())
+        return digest.hexdigest()
+
+    def read_day(self, date, field='close'):
+        """讀取單一交易日的一個欄位，回傳 Series；該日沒有此欄位時為全 NaN。"""
+        info = self.manifest['partitions'][to_western_date(date)]
+        with np.load(os.path.join(self.dir, info['file']), allow_pickle=False) as part:
+            codes = pd.Index(part['codes'], dtype=object)
+            values = part[field] if field in part.files else np.full(len(codes), np.nan)
+            return pd.Series(values, index=codes, name=info['label'])
+
+    def read_quotes(self, date, fields=None):
+        """讀取單一交易日的多個欄位，回傳以欄位名稱為欄的 DataFrame。"""
+        info = self.manifest['partitions'][to_western_date(date)]
+        fields = list(fields or info.get('fields', ['close']))
+        with np.load(os.path.join(self.dir, info['file']), allow_pickle=False) as part:
+            codes = pd.Index(part['codes'], dtype=object, name='證券代號')
+            df = pd.DataFrame({field: part[field] if field in part.files else np.full(len(codes), np.nan)
+                               for field in fields}, index=codes, columns=fields)
+        df.attrs['date'] = info['label']
+        return df
+
+    def read_matrix(self, start_date=None, end_date=None, field='close'):
+        """只讀取區間內的分區，組成與舊 CSV 相同的寬表（列為股票代號，欄為日期）。
+
+        field 指定要讀取的欄位，預設為收盤價；每個分區只會讀取這一個欄位。
+        """
+        days = [self.read_day(date, field) for date in self.dates(start_date, end_date)]
+        if not days:
+            return pd.DataFrame()
+        df = pd.concat(days, axis=1)
+        df.index.name = '證券代號'
+        return df
+
+    def import_csv(self, csv_file):
+        """將既有的寬表 CSV 轉入分區儲存，已存在的日期會被略過。"""
+        df = pd.read_csv(csv_file, index_col=0, dtype={0: str})
+        added = 0
+        for column in df.columns:
+            if not self.has_date(column):
+                self.append(df[column].dropna(), column)
+                added += 1
+        print(f"已從 {csv_file} 匯入 {added} 個交易日")
+
+
+def _column(values, integer=False):
+    """依欄位決定型別，不隨當天資料是否有缺值而改變：整數欄位為 int64（缺值為 0），其餘為 float64（缺值為 NaN）。"""
+    if integer:
+        return values.fillna(0).to_numpy(dtype='int64')
+    return values.to_numpy(dtype='float64', na_value=np.nan)
+
+
+def load_price_frame(source, start_date=None, end_date=None):
+    """讀取價格寬表，source 可以是 DataFrame、PriceStore、PriceMatrix 或 CSV 路徑。"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    if isinstance(source, PriceStore):
+        return source.read_matrix(start_date, end_date)
+    if hasattr(source, 'window'):  # PriceMatrix
+        return source.window(start_date, end_date).to_frame()
+    return pd.read_csv(source, index_col=0)
+
+
+# 使用示例
+if __name__ == "__main__":
+    with open('olddate.txt', 'r') as f:
+        old_date = f.readline().strip()
+    for market in ['otc', 'tse']:
+        csv_file = os.path.join(market, f'stock_prices_20240701_{old_date}.csv')
+        if os.path.exists(csv_file):
+            PriceStore(market).import_csv(csv_file)
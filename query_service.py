@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+
+from classification import SecurityClassifier, select
+from flow_store import FlowStore
+from price_store import PriceStore
+from returns import DEFAULT_HORIZONS, forward_fill, returns_frame
+from screening import Screener, close, combine_markets, dealer, foreign, gain, trust
+
+MARKETS = ('otc', 'tse')
+
+# 篩選條件：以逗號分隔、全部成立（AND），例如 gain5>=0.05,close<100,foreign5>0
+CONDITION = re.compile(r'^\s*(gain|close|foreign|trust|dealer)(\d*)\s*(>=|<=|>|<)\s*(-?[\d.]+)\s*$')
+FIELD_FACTORIES = {'gain': gain, 'foreign': foreign, 'trust': trust, 'dealer': dealer}
+
+
+def parse_field(text):
+    """'gain20'、'close'、'foreign5' 轉為 screening.Field。"""
+    match = re.fullmatch(r'\s*(gain|close|foreign|trust|dealer)(\d*)\s*', text)
+    if not match:
+        raise ValueError(f"無法辨識的欄位：{text}")
+    kind, days = match.groups()
+    if kind == 'close':
+        return close()
+    return FIELD_FACTORIES[kind](int(days or (5 if kind == 'gain' else 1)))
+
+
+def parse_conditions(text):
+    """把查詢字串中的條件轉為 screening.Predicate，沒有條件時回傳 None。"""
+    predicate = None
+    for part in filter(None, (text or '').split(',')):
+        match = CONDITION.match(part)
+        if not match:
+            raise ValueError(f"無法辨識的條件：{part}")
+        kind, days, op, value = match.groups()
+        field = parse_field(kind + days)
+        value = float(value)
+        term = {'>=': field >= value, '<=': field <= value, '>': field > value, '<': field < value}[op]
+        predicate = term if predicate is None else predicate & term
+    return predicate
+
+
+def parse_k(value):
+    """排行筆數，必須是正整數。"""
+    k = int(value)
+    if k <= 0:
+        raise ValueError(f"k 必須大於 0：{value}")
+    return k
+
+
+def _clean(value):
+    """NaN 轉為 None，numpy 數值轉為 Python 型別，方便輸出 JSON。"""
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class Snapshot:
+    """某一時點的唯讀資料：各市場的漲幅排行（已轉成可直接輸出的紀錄）、預先排好的順序與篩選器。
+
+    建立後不再修改，查詢時不需要加鎖；新的資料以另一個 Snapshot 整個替換。
+    """
+
+    def __init__(self, markets=MARKETS, root='store', kinds=('four_digit',), horizons=DEFAULT_HORIZONS):
+        self.kinds = tuple(kinds)
+        self.created_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.gains = {}
+        self.records = {}
+        self.positions = {}
+        self.orders = {}
+        self.last_date = {}
+        digest = hashlib.sha256(f"{','.join(self.kinds)}:{tuple(horizons)};".encode())
+        prices = []
+        # 查詢服務只讀不寫，類別快取也不落盤
+        classifier = SecurityClassifier(os.path.join(root, 'classification'), read_only=True)
+        for market in markets:
+            store = PriceStore(market, root)
+            if not store.exists():
+                continue
+            dates = store.dates()
+            digest.update(f'{market}:{store.fingerprint(dates)};'.encode())
+            df = select(store.read_matrix(), self.kinds, market, classifier)
+            gains = returns_frame(df, horizons)
+            self.gains[market] = gains
+            closes = forward_fill(df.sort_index(axis=1).to_numpy(dtype='float64', na_value=np.nan))[:, -1]
+            # 每檔股票的輸出內容預先建好，查詢時只需取出
+            self.records[market] = [{'股票代碼': code, 'market': market,
+                                     **{name: _clean(value) for name, value in row.items()}, '收盤價': _clean(price)}
+                                    for code, row, price in zip(gains.index, gains.to_dict('records'), closes)]
+            self.positions[market] = {code: i for i, code in enumerate(gains.index)}
+            self.last_date[market] = dates[-1]
+            # 每個期間預先排序一次，top-K 查詢只需切片
+            self.orders[market] = {column: np.argsort(-np.nan_to_num(gains[column].to_numpy(), nan=-np.inf),
+                                                      kind='stable')
+                                   for column in gains.columns}
+            prices.append(df)
+        # foreign/trust/dealer 條件使用法人買賣超歷史；法人資料更新時版本與 ETag 也會改變
+        flow_store = FlowStore(root)
+        flows = {}
+        if flow_store.exists():
+            digest.update(f'flows:{flow_store.fingerprint(flow_store.dates())};'.encode())
+            flows = flow_store.flows()
+        self.version = digest.hexdigest()[:16]
+        self.markets = list(self.gains)
+        self.screener = Screener(combine_markets(*prices), flows) if prices else None
+        self.symbols = {}
+        for market in reversed(self.markets):
+            self.symbols.update(dict.fromkeys(self.gains[market].index, market))
+
+    @property
+    def etag(self):
+        return f'"{self.version}"'
+
+    def info(self):
+        return {'version': self.version, 'created_at': self.created_at, 'kinds': list(self.kinds),
+                'markets': {market: {'symbols': len(self.gains[market]), 'last_date': self.last_date[market]}
+                            for market in self.markets}}
+
+    def top(self, market, period='5天', k=20):
+        """依指定期間漲幅由大到小的前 k 名。"""
+        if market not in self.gains:
+            raise KeyError(f"沒有 {market} 市場的資料")
+        column = period if period.endswith('漲幅') else f'{period}漲幅'
+        if column not in self.orders[market]:
+            raise ValueError(f"沒有 {column} 欄位，可用：{', '.join(self.gains[market].columns)}")
+        records = self.records[market]
+        return [records[i] for i in self.orders[market][column][:parse_k(k)]]
+
+    def symbol(self, code):
+        market = self.symbols.get(code)
+        if market is None:
+            raise KeyError(f"找不到股票代碼 {code}")
+        return self.records[market][self.positions[market][code]]
+
+    def screen(self, where=None, rank_by='gain5', k=20):
+        k = parse_k(k)
+        if self.screener is None:
+            return []
+        result = self.screener.screen(parse_conditions(where), parse_field(rank_by), k)
+        return [{name: _clean(value) for name, value in row.items()} for row in result.to_dict('records')]
+
+
+class QueryService:
+    """保存目前的 Snapshot，並在每日 pipeline 完成後於背景建立新的 Snapshot 再原子地替換。
+
+    pipeline 每次寫完漲幅排行都會更新 <market>/pipeline_manifest.json，FlowStore 新增法人資料時會更新 <root>/flows/manifest.json，
+    watch() 以這些檔案的修改時間判斷是否需要重新載入；也可以直接呼叫 reload()（或 POST /reload）。
+    """
+
+    def __init__(self, markets=MARKETS, root='store', kinds=('four_digit',), horizons=DEFAULT_HORIZONS):
+        self.markets = markets
+        self.root = root
+        self.kinds = kinds
+        self.horizons = horizons
+        self.reload_lock = threading.Lock()
+        self.stop = threading.Event()
+        self.signature = self._signature()
+        self.snapshot = Snapshot(markets, root, kinds, horizons)
+
+    def _signature(self):
+        paths = [os.path.join(market, 'pipeline_manifest.json') for market in self.markets]
+        paths.append(os.path.join(self.root, 'flows', 'manifest.json'))
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+    def reload(self):
+        """建立新的 Snapshot；建立期間查詢仍由舊的 Snapshot 回應，完成後一次替換。"""
+        with self.reload_lock:
+            signature = self._signature()
+            snapshot = Snapshot(self.markets, self.root, self.kinds, self.horizons)
+            changed = snapshot.version != self.snapshot.version
+            if changed:
+                self.snapshot = snapshot
+                print(f"已載入新的資料版本 {snapshot.version}")
+            self.signature = signature
+            return changed
+
+    def watch(self, interval=30):
+        """背景檢查 pipeline 是否完成新的一輪。"""
+        while not self.stop.wait(interval):
+            if self._signature() != self.signature:
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"重新載入資料時出錯：{type(e).__name__}: {str(e)}")
+
+    def handle(self, path, query):
+        """回傳 (狀態碼, 內容, 使用的 Snapshot)。"""
+        snapshot = self.snapshot  # 同一個請求只使用同一個版本
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+        try:
+            if not parts or parts == ['info']:
+                return 200, snapshot.info(), snapshot
+            if parts[0] == 'top' and len(parts) == 2:
+                return 200, snapshot.top(parts[1], params.get('period', '5天'), params.get('k', 20)), snapshot
+            if parts[0] == 'symbol' and len(parts) == 2:
+                return 200, snapshot.symbol(parts[1]), snapshot
+            if parts == ['screen']:
+                return 200, snapshot.screen(params.get('where'), params.get('rank', 'gain5'),
+                                            params.get('k', 20)), snapshot
+            return 404, {'error': f"不支援的路徑：{path}"}, snapshot
+        except KeyError as e:
+            return 404, {'error': str(e.args[0] if e.args else e)}, snapshot
+        except ValueError as e:
+            return 400, {'error': str(e)}, snapshot
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        status, body, snapshot = self.service.handle(url.path, url.query)
+        # 內容只取決於網址與資料版本，同一版本的 ETag 相同
+        if status == 200 and snapshot.etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', snapshot.etag)
+            self.end_headers()
+            return
+        self._send(status, body, snapshot.etag if status == 200 else None)
+
+    def do_POST(self):
+        if urlparse(self.path).path.strip('/') != 'reload':
+            self._send(404, {'error': f"不支援的路徑：{self.path}"})
+            return
+        try:
+            changed = self.service.reload()
+        except Exception as e:
+            # 建立失敗時 reload() 不會替換，查詢繼續使用舊的 Snapshot
+            self._send(500, {'error': f"{type(e).__name__}: {str(e)}", 'version': self.service.snapshot.version})
+            return
+        self._send(200, {'reloaded': changed, 'version': self.service.snapshot.version})
+
+    def _send(self, status, body, etag=None):
+        content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Cache-Control', 'no-cache')
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=8050, watch_interval=30, **kwargs):
+    """啟動查詢服務；只綁定本機位址。"""
+    service = QueryService(**kwargs)
+    handler = type('Handler', (QueryHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=service.watch, args=(watch_interval,), daemon=True).start()
+    print(f"查詢服務已啟動：http://{host}:{port}/（資料版本 {service.snapshot.version}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop.set()
+        server.server_close()
+
+
+# 使用示例
+if __name__ == "__main__":
+    # GET /top/otc?period=5天&k=20、/symbol/6488、/screen?where=gain5>=0.05,close<100&rank=gain20&k=20
+    serve()
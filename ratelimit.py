@@ -0,0 +1,98 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """令牌桶：平均每秒最多 rate 個請求，最多允許 capacity 個突發請求。
+
+    被 slow_down 降速後，每經過 recover_after 秒沒有再被限流，速率就加倍，直到回到設定的 base_rate。
+    """
+
+    def __init__(self, rate, capacity=1, recover_after=60.0):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = float(rate)
+        self.base_rate = self.rate
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.recover_after = recover_after
+        self.slowed_at = None
+        self.lock = threading.Lock()
+
+    def _recover(self, now):
+        if self.slowed_at is not None and now - self.slowed_at >= self.recover_after:
+            self.rate = min(self.rate * 2, self.base_rate)
+            self.slowed_at = None if self.rate >= self.base_rate else now
+
+    def slow_down(self, factor=0.5, min_rate=0.05):
+        with self.lock:
+            self.rate = max(self.rate * factor, min(min_rate, self.base_rate))
+            self.tokens = min(self.tokens, 0.0)
+            self.slowed_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._recover(now)
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """取得一個令牌，必要時阻塞等待，回傳等待的秒數。"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    """依主機名稱分別限速，TWSE 與 TPEx 各自擁有一個令牌桶。"""
+
+    def __init__(self, rate=0.5, capacity=2, per_host=None, recover_after=60.0):
+        # per_host: {'www.twse.com.tw': (rate, capacity)} 可覆寫個別主機的設定
+        self.rate = rate
+        self.capacity = capacity
+        self.recover_after = recover_after  # 降速後多久沒再被限流就逐步恢復速率（秒）
+        self.per_host = dict(per_host or {})
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                rate, capacity = self.per_host.get(host, (self.rate, self.capacity))
+                self.buckets[host] = TokenBucket(rate, capacity, self.recover_after)
+            return self.buckets[host]
+
+    def acquire(self, url):
+        """依網址的主機取得令牌，回傳等待的秒數。"""
+        return self.bucket(urlparse(url).netloc).acquire()
+
+    def slow_down(self, url, factor=0.5, min_rate=0.05):
+        """被限流時降低該主機的請求速率；之後 recover_after 秒內沒再被限流就逐步恢復。"""
+        self.bucket(urlparse(url).netloc).slow_down(factor, min_rate)
+
+
+# 行程內共用的限速器：沒有指定 rate_limiter 時，股價與三大法人的抓取都經過同一組令牌桶
+shared_limiter = HostRateLimiter()
+
+
+# 使用示例
+if __name__ == "__main__":
+    limiter = HostRateLimiter(rate=10, capacity=1, recover_after=0.2)
+    url = 'https://www.twse.com.tw/exchangeReport/MI_INDEX'
+    for _ in range(3):
+        limiter.slow_down(url)
+    print(f"連續被限流三次後：{limiter.bucket('www.twse.com.tw').rate} 次/秒")
+    for _ in range(4):
+        time.sleep(0.25)
+        limiter.acquire(url)
+        print(f"恢復中：{limiter.bucket('www.twse.com.tw').rate} 次/秒")
+    assert limiter.bucket('www.twse.com.tw').rate == 10
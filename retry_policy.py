@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+import requests
+
+# 錯誤類別
+NO_DATA = 'no_data'        # 伺服器明確表示查無資料（空白內容或「很抱歉，沒有符合條件的資料」）：休市，不重試
+TRANSIENT = 'transient'    # 連線錯誤、逾時、HTTP 5xx、內容被截斷或無法解析：指數退避加隨機抖動後重試
+THROTTLED = 'throttled'    # HTTP 429/403 或被導向封鎖頁面：觸發該主機的斷路器並降低請求速率
+FATAL = 'fatal'            # 其他 HTTP 4xx：重試也不會成功，直接放棄
+
+# 決策：action 為 'retry'、'no_data' 或 'give_up'
+RetryDecision = namedtuple('RetryDecision', ['action', 'error_class', 'delay', 'attempt', 'status', 'error'])
+
+# 交易所查無資料時的訊息，Big5（行情 CSV）與 UTF-8（JSON 報表）都可能出現
+NO_DATA_MARKERS = tuple(text.encode(encoding) for text in ('很抱歉', '沒有符合條件') for encoding in ('big5', 'utf-8'))
+
+
+def is_no_data(content):
+    """回應是否明確表示查無資料：空白內容，或開頭含有「很抱歉，沒有符合條件的資料」訊息。"""
+    head = content[:1024]
+    return not content.strip() or any(marker in head for marker in NO_DATA_MARKERS)
+
+
+class CircuitBreaker:
+    """單一主機的斷路器：被限流後在冷卻時間內暫停所有對該主機的請求。"""
+
+    def __init__(self, cooldown=60):
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def trip(self):
+        with self.lock:
+            self.trips += 1
+            # 連續被限流時冷卻時間加倍
+            self.open_until = time.monotonic() + self.cooldown * min(2 ** (self.trips - 1), 8)
+
+    def reset(self):
+        with self.lock:
+            self.trips = 0
+
+    def wait(self):
+        """斷路器開啟時阻塞到冷卻結束，回傳等待秒數。"""
+        remaining = self.open_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+            return remaining
+        return 0.0
+
+
+class RetryPolicy:
+    """依錯誤類別決定是否重試與等待多久，並在被限流時放慢整個抓取池。"""
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=60.0, cooldown=60, slowdown=0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cooldown = cooldown
+        self.slowdown = slowdown
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.cooldown)
+            return self.breakers[host]
+
+    def before_request(self, url):
+        """每次請求前呼叫；該主機的斷路器開啟時等待。"""
+        return self.breaker(url).wait()
+
+    def on_success(self, url):
+        self.breaker(url).reset()
+
+    def classify(self, error, response=None):
+        """把例外歸類為 NO_DATA、TRANSIENT、THROTTLED 或 FATAL，回傳 (類別, HTTP 狀態碼)。"""
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            if status in (403, 429):
+                return THROTTLED, status
+            if status is not None and status >= 500:
+                return TRANSIENT, status
+            return FATAL, status
+        if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+            return TRANSIENT, None
+        status = response.status_code if response is not None else None
+        if response is not None and isinstance(error, (StopIteration, ValueError, KeyError)):
+            head = response.content[:512].lstrip().lower()
+            if head.startswith(b'<!doctype html') or head.startswith(b'<html'):
+                # 沒有行情表而是網頁，通常是被暫時封鎖
+                return THROTTLED, status
+            if is_no_data(response.content):
+                return NO_DATA, status
+            # 被截斷的 CSV、欄位改版或維護頁面：重試，且不會被記成休市日
+        return TRANSIENT, status
+
+    def backoff(self, attempt):
+        """指數退避：上限 max_delay，取一半固定、一半隨機抖動。"""
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def decide(self, error, attempt, url, response=None, rate_limiter=None):
+        """回傳 RetryDecision，THROTTLED 時同時觸發斷路器並降低該主機的請求速率。"""
+        error_class, status = self.classify(error, response)
+        name = error.__class__.__name__
+        if error_class == NO_DATA:
+            return RetryDecision('no_data', error_class, 0.0, attempt, status, name)
+        if error_class == FATAL:
+            return RetryDecision('give_up', error_class, 0.0, attempt, status, name)
+        if error_class == THROTTLED:
+            self.breaker(url).trip()
+            if rate_limiter is not None:
+                rate_limiter.slow_down(url, self.slowdown)
+        if attempt + 1 >= self.max_attempts:
+            return RetryDecision('give_up', error_class, 0.0, attempt, status, name)
+        # 斷路器的冷卻由 before_request 負責等待，這裡只需要一般的退避
+        return RetryDecision('retry', error_class, self.backoff(attempt), attempt, status, name)
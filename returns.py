@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_HORIZONS = (5, 10, 20)
+
+
+def forward_fill(values):
+    """沿日期軸向前填補 NaN（停牌日沿用最後一筆有效收盤價）。"""
+    values = np.asarray(values, dtype='float64')
+    mask = np.isnan(values)
+    if not mask.any():
+        return values
+    idx = np.where(mask, 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return values[np.arange(values.shape[0])[:, None], idx]
+
+
+def first_valid(values):
+    """每檔股票第一筆有效收盤價，沒有則為 NaN。"""
+    values = np.asarray(values, dtype='float64')
+    valid = ~np.isnan(values)
+    first = valid.argmax(axis=1)
+    result = values[np.arange(values.shape[0]), first]
+    result[~valid.any(axis=1)] = np.nan
+    return result
+
+
+def compute_returns(values, horizons=DEFAULT_HORIZONS, total=True):
+    """一次計算多個期間的漲幅，回傳 (股票數, 期間數[+1]) 的陣列。
+
+    與原本的定義相同，N 天漲幅是最後一天相對於倒數第 N 天的漲幅；資料不足 N 天時為 NaN。
+    total 為 True 時最後一欄是相對於第一筆有效價格的總漲幅。
+    """
+    filled = forward_fill(values)
+    num_symbols, num_days = filled.shape
+    columns = len(horizons) + (1 if total else 0)
+    result = np.full((num_symbols, columns), np.nan)
+    if num_days == 0:
+        return result
+    last = filled[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, horizon in enumerate(horizons):
+            if num_days >= horizon:
+                base = filled[:, -horizon]
+                result[:, i] = (last - base) / base
+        if total:
+            base = first_valid(values)
+            result[:, -1] = (last - base) / base
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+def horizon_label(horizon):
+    return '總漲幅' if horizon == 'total' else f'{horizon}天漲幅'
+
+
+def returns_frame(df, horizons=DEFAULT_HORIZONS, total=True):
+    """由價格寬表計算各期間漲幅，回傳數值型 DataFrame（索引為股票代碼）。"""
+    result = compute_returns(df.to_numpy(dtype='float64', na_value=np.nan), horizons, total)
+    labels = [horizon_label(h) for h in horizons] + (['總漲幅'] if total else [])
+    return pd.DataFrame(result, index=df.index, columns=labels)
+
+
+def top_k(values, k):
+    """回傳漲幅最大的 k 個位置（由大到小），NaN 不列入；只做部分排序。"""
+    values = np.asarray(values, dtype='float64')
+    valid = np.flatnonzero(~np.isnan(values))
+    if k >= len(valid):
+        return valid[np.argsort(-values[valid], kind='stable')]
+    part = valid[np.argpartition(-values[valid], k - 1)[:k]]
+    return part[np.argsort(-values[part], kind='stable')]
+
+
+def format_percent(values):
+    """只在輸出時把數值轉為百分比字串，NaN 顯示為 N/A。"""
+    values = np.asarray(values, dtype='float64')
+    text = np.char.mod('%.2f%%', np.nan_to_num(values) * 100)
+    return np.where(np.isnan(values), 'N/A', text)
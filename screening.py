@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+
+from cache import to_western_date
+from price_matrix import PriceMatrix
+from returns import compute_returns, top_k
+
+FLOW_COLUMNS = {
+    'foreign': '外陸資買賣超股數(不含外資自營商)',
+    'trust': '投信買賣超股數',
+    'dealer': '自營商買賣超股數',
+}
+
+
+class Predicate:
+    """可組合的篩選條件，以 &、|、~ 組合，對齊股票代號後回傳布林遮罩。"""
+
+    def __init__(self, func, text):
+        self.func = func
+        self.text = text
+
+    def mask(self, screener, as_of):
+        return self.func(screener, as_of)
+
+    def __and__(self, other):
+        return Predicate(lambda s, d: self.mask(s, d) & other.mask(s, d), f'({self.text} & {other.text})')
+
+    def __or__(self, other):
+        return Predicate(lambda s, d: self.mask(s, d) | other.mask(s, d), f'({self.text} | {other.text})')
+
+    def __invert__(self):
+        return Predicate(lambda s, d: ~self.mask(s, d), f'~{self.text}')
+
+    def __repr__(self):
+        return self.text
+
+
+class Field:
+    """可被篩選或排序的欄位：漲幅、收盤價或法人買超張數。"""
+
+    def __init__(self, kind, days=1):
+        self.kind = kind
+        self.days = days
+
+    @property
+    def name(self):
+        if self.kind == 'gain':
+            return f'{self.days}天漲幅'
+        if self.kind == 'close':
+            return '收盤價'
+        return f'{self.kind}_{self.days}日買超張數'
+
+    def values(self, screener, as_of):
+        return screener.field_values(self, as_of)
+
+    def _compare(self, op, value, symbol):
+        def func(screener, as_of):
+            with np.errstate(invalid='ignore'):
+                return op(self.values(screener, as_of), value)
+        return Predicate(func, f'{self.name} {symbol} {value}')
+
+    def __ge__(self, value):
+        return self._compare(np.greater_equal, value, '>=')
+
+    def __gt__(self, value):
+        return self._compare(np.greater, value, '>')
+
+    def __le__(self, value):
+        return self._compare(np.less_equal, value, '<=')
+
+    def __lt__(self, value):
+        return self._compare(np.less, value, '<')
+
+    def between(self, low, high):
+        return (self >= low) & (self <= high)
+
+
+def gain(days):
+    return Field('gain', days)
+
+
+def close():
+    return Field('close')
+
+
+def foreign(days=1):
+    return Field('foreign', days)
+
+
+def trust(days=1):
+    return Field('trust', days)
+
+
+def dealer(days=1):
+    return Field('dealer', days)
+
+
+def flows_from_t86(frames):
+    """把 {日期: T86 DataFrame} 轉為 {'foreign'|'trust'|'dealer': 寬表（張）}。"""
+    flows = {}
+    for key, column in FLOW_COLUMNS.items():
+        series = []
+        for date, df in frames.items():
+            if column not in df.columns:
+                continue
+            values = pd.to_numeric(df[column].astype(str).str.replace(',', '', regex=False), errors='coerce') / 1000
+            series.append(pd.Series(values.to_numpy(), index=df['證券代號'].astype(str).str.strip(),
+                                    name=to_western_date(date)))
+        if series:
+            flows[key] = pd.concat(series, axis=1).sort_index(axis=1)
+    return flows
+
+
+class Screener:
+    """對齊股票代號的向量化篩選引擎，欄位值與排序索引依 (欄位, 日期) 快取。
+
+    matrix 可以是單一市場或上市加上櫃合併的 PriceMatrix；flows 來自 flows_from_t86 或法人資料儲存庫。
+    """
+
+    def __init__(self, matrix, flows=None):
+        if isinstance(matrix, pd.DataFrame):
+            matrix = PriceMatrix.from_frame(matrix)
+        self.matrix = matrix
+        self.symbols = pd.Index(matrix.symbols)
+        self.flows = {}
+        for key, df in (flows or {}).items():
+            df = df.reindex(self.symbols)
+            df.columns = [to_western_date(column) for column in df.columns]
+            self.flows[key] = df.sort_index(axis=1)
+        self._fields = {}
+        self._ranks = {}
+
+    def _day_index(self, as_of):
+        if as_of is None:
+            return len(self.matrix.dates)
+        return int(np.searchsorted(self.matrix.dates, to_western_date(as_of), side='right'))
+
+    def field_values(self, field, as_of=None):
+        key = (field.kind, field.days, as_of)
+        if key not in self._fields:
+            self._fields[key] = self._compute(field, as_of)
+        return self._fields[key]
+
+    def _compute(self, field, as_of):
+        end = self._day_index(as_of)
+        if field.kind == 'gain':
+            # 用到 end 為止的完整歷史，停牌日才能沿用更早的收盤價
+            return compute_returns(self.matrix.values[:, :end], (field.days,), total=False)[:, 0]
+        if field.kind == 'close':
+            return _last_valid(self.matrix.values[:, :end])
+        df = self.flows.get(field.kind)
+        if df is None:
+            raise KeyError(f"沒有 {field.kind} 的法人買賣超資料")
+        last_date = to_western_date(as_of) if as_of else '99999999'
+        columns = [column for column in df.columns if column <= last_date][-field.days:]
+        if not columns:
+            return np.full(len(self.symbols), np.nan)
+        values = df[columns].to_numpy(dtype='float64', na_value=np.nan)
+        total = np.nansum(values, axis=1)
+        total[np.isnan(values).all(axis=1)] = np.nan
+        return total
+
+    def rank_index(self, field, as_of=None):
+        """由大到小的排序索引（NaN 在最後），每個 (欄位, 日期) 只排序一次。"""
+        key = (field.kind, field.days, as_of)
+        if key not in self._ranks:
+            values = self.field_values(field, as_of)
+            self._ranks[key] = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind='stable')
+        return self._ranks[key]
+
+    def screen(self, predicate=None, rank_by=None, k=20, as_of=None, fields=()):
+        """回傳符合條件、依 rank_by 由大到小的前 k 名。"""
+        rank_by = rank_by or gain(5)
+        mask = predicate.mask(self, as_of) if predicate is not None else np.ones(len(self.symbols), dtype=bool)
+        values = self.field_values(rank_by, as_of)
+        mask = mask & ~np.isnan(values)
+        if k and mask.sum() > 4 * k:
+            order = np.flatnonzero(mask)[top_k(values[mask], k)]
+        else:
+            order = self.rank_index(rank_by, as_of)
+            order = order[mask[order]][:k or None]
+        result = pd.DataFrame({'股票代碼': self.symbols[order]})
+        for field in (rank_by, *fields):
+            result[field.name] = self.field_values(field, as_of)[order]
+        return result
+
+
+def combine_markets(*frames):
+    """合併上市與上櫃的價格寬表；欄名統一成西元日期，以免民國日期與西元日期錯位。"""
+    aligned = []
+    for df in frames:
+        df = df.copy()
+        df.columns = [to_western_date(column) for column in df.columns]
+        aligned.append(df)
+    combined = pd.concat(aligned).sort_index(axis=1)
+    return combined[~combined.index.duplicated(keep='first')]
+
+
+def _last_valid(values):
+    """每列最後一筆有效值。"""
+    values = np.asarray(values, dtype='float64')
+    if values.shape[1] == 0:
+        return np.full(values.shape[0], np.nan)
+    valid = ~np.isnan(values)
+    last = values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    result = values[np.arange(values.shape[0]), last]
+    result[~valid.any(axis=1)] = np.nan
+    return result
+
+
+# 使用示例
+if __name__ == "__main__":
+    from price_store import PriceStore
+    matrix = PriceMatrix.from_frame(combine_markets(PriceStore('tse').read_matrix(), PriceStore('otc').read_matrix()))
+    screener = Screener(matrix)
+    print(screener.screen((gain(5) >= 0.05) & (close() <= 100), rank_by=gain(20), k=20, fields=[gain(5), close()]))
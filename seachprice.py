@@ -1,16 +1,40 @@
 import pandas as pd
-import io
 import time
 import random
 import requests
-import csv
 from datetime import datetime, timedelta
 from tqdm import tqdm
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from ratelimit import HostRateLimiter, shared_limiter
+from cache import RawResponseCache
+from trading_calendar import TradingCalendar
+from price_store import PriceStore
+from parsers import QUOTE_FIELDS, parse_quotes
+from metrics import metrics
+from retry_policy import RetryPolicy
+
+TSE_URL = 'https://www.twse.com.tw/exchangeReport/MI_INDEX'
+OTC_URL = 'https://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php'
 
 class StockDataFetcher:
-    def __init__(self,start_date=None, end_date=None, stock_type=None):
+    def __init__(self,start_date=None, end_date=None, stock_type=None, max_workers=1, rate_limiter=None, cache=None, offline=False, calendar=None, fields=('close',), tse_url=TSE_URL, otc_url=OTC_URL):
         self.session = requests.Session()
+        self.tse_url = tse_url  # 測試時可指向本機的模擬交易所（mock_exchange.py）
+        self.otc_url = otc_url
+        self.set_fields(fields)  # 解析時保留的行情欄位（parsers.QUOTE_FIELDS），一律包含 close
+        self.calendar = calendar
+        self.retry_policy = RetryPolicy()
+        self.on_decision = None  # 每次重試決策的回呼函式 (type, date, RetryDecision)
+        self.decisions = deque(maxlen=1000)  # 最近的重試決策
+        self.cache = cache
+        self.offline = offline  # 只從快取重播，不發送任何網路請求
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        if max_workers > 1:
+            self._mount_pool(max_workers)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
@@ -26,90 +50,191 @@ class StockDataFetcher:
     def set_stock_type(self, stock_type):
         """設置股票類型。"""
         self.stock_type = stock_type
+
+    def set_cache(self, cache_dir='cache', today_ttl=600, offline=False):
+        """啟用原始回應快取；offline 為 True 時只讀快取。"""
+        self.cache = RawResponseCache(cache_dir, today_ttl=today_ttl)
+        self.offline = offline
+
+    def set_fields(self, fields=QUOTE_FIELDS):
+        """設置要保存的行情欄位，預設為完整的開高低收、成交量值、筆數與最後買賣價。"""
+        self.fields = ('close', *(field for field in fields if field != 'close'))
+
+    def set_calendar(self, calendar=None):
+        """設置交易日曆，已知的休市日不會發送請求。"""
+        self.calendar = calendar or TradingCalendar()
+
+    def set_concurrency(self, max_workers, rate=0.5, capacity=2):
+        """設置並行抓取的執行緒數量與每個主機的請求速率（每秒請求數）。"""
+        self.max_workers = max_workers
+        self.rate_limiter = HostRateLimiter(rate=rate, capacity=capacity)
+        self._mount_pool(max_workers)
+
+    def _mount_pool(self, max_workers):
+        # 讓連線池足夠容納同時進行的請求
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
     def get_stock_data(self, date, type):
-        """獲取指定日期的股票數據。"""
+        """獲取指定日期的股票數據（收盤價 Series）。"""
+        quotes = self.get_daily_quotes(date, type)
+        if quotes.empty:
+            return pd.Series(dtype='float64', name=date)
+        return quotes['close'].rename('收盤價')
+
+    def get_daily_quotes(self, date, type):
+        """獲取指定日期的行情，一次解析出 self.fields 的所有欄位，回傳 DataFrame（沒有數據時為空）。"""
+        empty = pd.DataFrame(columns=list(self.fields), dtype='float64')
         if type == 'tse':
-            url = f'https://www.twse.com.tw/exchangeReport/MI_INDEX?response=csv&date={date}&type=ALL'
+            url = f'{self.tse_url}?response=csv&date={date}&type=ALL'
         else:
-            url = f'https://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php?l=zh-tw&d={date}&s=0,asc,0'
+            url = f'{self.otc_url}?l=zh-tw&d={date}&s=0,asc,0'
+
+        if self.calendar and not self.calendar.is_trading_day(date, type):
+            return empty
+
+        if self.cache:
+            cached = self.cache.get(type, date)
+            if cached is not None:
+                try:
+                    with metrics.stage('parse', type, date):
+                        return self._parse_raw(type, *cached)
+                except Exception as e:
+                    print(f"解析快取 {type} {date} 時出錯：{str(e)}")
+        if self.offline:
+            return empty
 
-        for attempt in range(3):  # 最多重試3次
+        for attempt in range(self.retry_policy.max_attempts):
+            recorded = False
+            response = None
+            self.retry_policy.before_request(url)
+            if self.rate_limiter:
+                self.rate_limiter.acquire(url)
+            start = time.perf_counter()
             try:
                 response = self.session.get(url, headers=self.headers, timeout=30)
                 response.raise_for_status()
+                metrics.record_fetch(type, date, time.perf_counter() - start, len(response.content), attempt,
+                                     status=response.status_code)
+                recorded = True
                 
-                if type == 'tse':
-                    return self._process_tse_data(response.text)
-                else:  # OTC
-                    return self._process_otc_data(response.content)
+                encoding = response.encoding or response.apparent_encoding
+                with metrics.stage('parse', type, date):
+                    data = self._parse_raw(type, response.content, encoding)
+                # 沒有解析出任何一列（例如收盤前的半成品）不寫入快取，以免之後一直重播成沒有資料
+                if self.cache and not data.empty:
+                    self.cache.put(type, date, response.content, encoding)
+                self.retry_policy.on_success(url)
+                return data
             except Exception as e:
-                print(f"嘗試 {attempt + 1} 獲取 {type} {date} 的數據時出錯：{str(e)}")
-                if attempt == 2:  # 在最後一次嘗試時打印更多信息
-                    print(f"響應內容: {response.text[:500]}...")  # 打印前500個字符
-                time.sleep(random.uniform(5, 10))  # 隨機等待5到10秒
+                if not recorded:
+                    status = getattr(getattr(e, 'response', None), 'status_code', None)
+                    metrics.record_fetch(type, date, time.perf_counter() - start, 0, attempt, e.__class__.__name__, status)
+                decision = self.retry_policy.decide(e, attempt, url, response, self.rate_limiter)
+                self._report_decision(type, date, decision)
+                print(f"嘗試 {attempt + 1} 獲取 {type} {date} 的數據時出錯（{decision.error_class}）：{str(e)}")
+                if decision.action == 'no_data':
+                    # 伺服器有回應但找不到行情表，通常代表休市
+                    if self.calendar:
+                        self.calendar.mark_non_trading(date, type)
+                    break
+                if decision.action == 'give_up':
+                    if response is not None:
+                        print(f"響應內容: {response.text[:500]}...")  # 打印前500個字符
+                    break
+                time.sleep(decision.delay)
         
-        return pd.Series(dtype='float64', name=date)  # 如果所有嘗試都失敗，返回空的Series
+        return empty  # 如果所有嘗試都失敗，返回空的 DataFrame
+
+    def _report_decision(self, type, date, decision):
+        self.decisions.append((type, date, decision))
+        if self.on_decision:
+            self.on_decision(type, date, decision)
+
+    def _parse_raw(self, type, content, encoding=None):
+        """將原始回應內容交給對應市場的解析函式，回傳 self.fields 的 DataFrame。"""
+        if type == 'tse':
+            return self._process_tse_quotes(content.decode(encoding or 'big5', errors='ignore'))
+        return self._process_otc_quotes(content)
+
+    def _process_tse_quotes(self, text):
+        return parse_quotes(text, 'tse', self.fields)
+
+    def _process_otc_quotes(self, content):
+        df = parse_quotes(content, 'otc', self.fields)
+        df.index.name = '股票代號'
+        return df
 
     def _process_tse_data(self, text):
-        lines = text.split('\n')
-        header_row = next(i for i, line in enumerate(lines) if '證券代號' in line)
-        df = pd.read_csv(io.StringIO('\n'.join(lines[header_row:])), 
-                         index_col='證券代號', 
-                         usecols=['證券代號', '證券名稱', '收盤價'], 
-                         dtype={'證券代號': str, '證券名稱': str, '收盤價': str})
-        df['收盤價'] = df['收盤價'].str.replace(',', '').str.replace('--', 'NaN')
-        df['收盤價'] = pd.to_numeric(df['收盤價'], errors='coerce')
-        return df['收盤價']
+        """只取收盤價的 Series（名稱為 '收盤價'），與原本的回傳格式相同。"""
+        return parse_quotes(text, 'tse', ('close',))['close'].rename('收盤價')
 
     def _process_otc_data(self, content):
-        content = content.decode('big5', errors='ignore')
-        reader = csv.reader(io.StringIO(content))
-        data = list(reader)
-        
-        header_row = next(i for i, row in enumerate(data) if '代號' in row)
-        headers = data[header_row]
-        
-        code_index = headers.index('代號')
-        close_index = headers.index('收盤 ')  # 注意這裡的空格
-        
-        stock_data = {}
-        for row in data[header_row+1:]:
-            if len(row) > max(code_index, close_index):
-                code = row[code_index].strip('"')
-                close = row[close_index].strip('"')
-                if code and close:
-                    stock_data[code] = close
-        
-        df = pd.DataFrame.from_dict(stock_data, orient='index', columns=['收盤價'])
-        df.index.name = '股票代號'
-        df['收盤價'] = pd.to_numeric(df['收盤價'], errors='coerce')
-        return df['收盤價']
+        series = parse_quotes(content, 'otc', ('close',))['close'].rename('收盤價')
+        series.index.name = '股票代號'
+        return series
     
-    def fetch_stock_data_range(self):
-        """獲取指定日期範圍內的股票數據。"""
+    def fetch_stock_data_range(self, concurrent=None, quotes=False, skip_dates=()):
+        """獲取指定日期範圍內的股票數據。
+
+        concurrent 為 True 時以執行緒池同時發送多個請求，並由 rate_limiter 控制每個主機的請求速率；
+        預設在 max_workers > 1 時啟用。quotes 為 True 時每天回傳 self.fields 的 DataFrame，否則為收盤價 Series。
+        skip_dates 中的日期（西元 YYYYMMDD，例如已存在於 PriceStore 的交易日）不會抓取。
+        """
+        fetch = self.get_daily_quotes if quotes else self.get_stock_data
         if not all([self.start_date, self.end_date, self.stock_type]):
             raise ValueError("請先設置開始日期、結束日期和股票類型")
 
-        date_range = pd.date_range(start=self.start_date, end=self.end_date, freq='B')  # 'B' 表示工作日
+        if self.calendar:
+            date_range = self.calendar.trading_days(self.start_date, self.end_date, self.stock_type)
+        else:
+            date_range = pd.date_range(start=self.start_date, end=self.end_date, freq='B')  # 'B' 表示工作日
+        skip_dates = set(skip_dates)
+        date_strs = [self._format_date(date) for date in date_range if date.strftime('%Y%m%d') not in skip_dates]
+
+        if concurrent is None:
+            concurrent = self.max_workers > 1
+        with metrics.stage('fetch_range', self.stock_type):
+            if concurrent:
+                return self._fetch_concurrent(date_strs, fetch)
+
+            all_data = []
+            for date_str in tqdm(date_strs, desc="處理進度"):
+                daily_data = fetch(date_str, self.stock_type)
+                self._collect(all_data, date_str, daily_data)
+                time.sleep(random.uniform(3, 7))  # 隨機等待3到7秒
+
+            return all_data  
+
+    def _fetch_concurrent(self, date_strs, fetch):
+        """以執行緒池並行抓取，結果依日期順序回傳。"""
+        if self.rate_limiter is None:
+            self.rate_limiter = shared_limiter
 
         all_data = []
-        for date in tqdm(date_range, desc="處理進度"):
-            date_str = date.strftime('%Y%m%d')
-            
-            if self.stock_type == 'otc':
-                date_str = self._convert_to_rocdate(date_str)
-            
-            daily_data = self.get_stock_data(date_str, self.stock_type)
-            if not daily_data.empty:
+        with ThreadPoolExecutor(max_workers=max(self.max_workers, 1)) as executor:
+            results = executor.map(lambda d: fetch(d, self.stock_type), date_strs)
+            for date_str, daily_data in tqdm(zip(date_strs, results), total=len(date_strs), desc="處理進度"):
+                self._collect(all_data, date_str, daily_data)
+        return all_data
+
+    def _format_date(self, date):
+        date_str = date.strftime('%Y%m%d')
+        if self.stock_type == 'otc':
+            date_str = self._convert_to_rocdate(date_str)
+        return date_str
+
+    def _collect(self, all_data, date_str, daily_data):
+        if not daily_data.empty:
+            if isinstance(daily_data, pd.Series):
                 daily_data.name = date_str  # 設置 Series 的名稱為日期字符串
-                all_data.append(daily_data)
-                tqdm.write(f"成功獲取 {date_str} 的數據")
             else:
-                tqdm.write(f"{date_str} 沒有數據（可能是假日）")
-            time.sleep(random.uniform(3, 7))  # 隨機等待3到7秒
-
-        return all_data  
+                daily_data.attrs['date'] = date_str
+            all_data.append(daily_data)
+            tqdm.write(f"成功獲取 {date_str} 的數據")
+        else:
+            tqdm.write(f"{date_str} 沒有數據（可能是假日）")
     
     def store_price(self):
         """將獲取的股票數據存儲到 CSV 文件中。"""
@@ -131,15 +256,16 @@ class StockDataFetcher:
         new_data = self.fetch_stock_data_range()
         
         if new_data:
-            new_df = pd.concat(new_data, axis=1)
-            
-            # 根據用戶選擇將新數據添加到頭部或尾部
-            if add_to.lower() == 'start':
-                combined_df = pd.concat([new_df, df], axis=1)
-                print(f"歷史數據已添加到文件頭部")
-            else:  # 默認添加到尾部
-                combined_df = pd.concat([df, new_df], axis=1)
-                print(f"歷史數據已添加到文件尾部")
+            with metrics.stage('merge', self.stock_type):
+                new_df = pd.concat(new_data, axis=1)
+                
+                # 根據用戶選擇將新數據添加到頭部或尾部
+                if add_to.lower() == 'start':
+                    combined_df = pd.concat([new_df, df], axis=1)
+                    print(f"歷史數據已添加到文件頭部")
+                else:  # 默認添加到尾部
+                    combined_df = pd.concat([df, new_df], axis=1)
+                    print(f"歷史數據已添加到文件尾部")
             
             
              
@@ -151,11 +277,12 @@ class StockDataFetcher:
             # 構建新的文件名
             new_filename = f"{self.stock_type}/stock_prices_20240701_{new_date}.csv"
             
-            # 保存合併後的數據到新文件
-            combined_df.to_csv(new_filename, encoding='utf-8-sig')
-            
-            # 刪除舊文件
-            os.remove(csv_file)
+            with metrics.stage('write', self.stock_type):
+                # 保存合併後的數據到新文件
+                combined_df.to_csv(new_filename, encoding='utf-8-sig')
+                
+                # 刪除舊文件
+                os.remove(csv_file)
             
             print(f"數據已保存到 {new_filename}")
             
@@ -165,6 +292,22 @@ class StockDataFetcher:
         else:
             print("沒有獲取到新的數據")
 
+    def append_to_store(self, store=None, missing_only=False):
+        """獲取日期範圍內的數據，逐日將 self.fields 的所有欄位寫入 PriceStore 分區。
+
+        已存在的日期預設會被覆寫；missing_only 為 True 時只抓取 PriceStore 中還沒有的日期。
+        """
+        store = store or PriceStore(self.stock_type)
+        new_data = self.fetch_stock_data_range(quotes=True, skip_dates=store.dates() if missing_only else ())
+        for daily_data in new_data:
+            with metrics.stage('write', self.stock_type, daily_data.attrs['date']):
+                store.append(daily_data)
+        if new_data:
+            print(f"已新增 {len(new_data)} 個交易日到 {store.dir}")
+        else:
+            print("沒有獲取到新的數據")
+        return store
+
     def _convert_to_rocdate(self, date):
         # 將西元年日期轉換為民國年日期
         western_year = int(date[:4])
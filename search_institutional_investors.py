@@ -1,48 +1,153 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select
-import pandas as pd
+import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+from cache import to_western_date
+from flow_store import parse_t86
+from ratelimit import shared_limiter
+from retry_policy import RetryPolicy
+
+T86_URL = "https://www.twse.com.tw/rwd/zh/fund/T86"
+
 
 class InstitutionalInvestors:
-    def __init__(self):
+    def __init__(self, calendar=None, use_browser=False, base_url=T86_URL, cache=None,
+                 rate_limiter=None, max_workers=4, browser_fallback=True, flow_store=None, retry_policy=None):
         self.url = "https://www.twse.com.tw/zh/trading/foreign/t86.html"
-        self.driver = webdriver.Chrome()
+        self.calendar = calendar  # TradingCalendar，已知休市日不開啟查詢頁面
+        self.use_browser = use_browser  # True 時沿用 Selenium 操作網頁
+        self.base_url = base_url  # T86 JSON 報表網址，測試時可指向本機的模擬伺服器
+        self.cache = cache  # RawResponseCache，與股價共用
+        # 與股價抓取共用限速器（例如傳入 StockDataFetcher 的 rate_limiter），預設為行程內共用的 shared_limiter
+        self.rate_limiter = rate_limiter or shared_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_workers = max_workers
+        self.browser_fallback = browser_fallback  # HTTP 失敗時改用 Selenium
+        self.flow_store = flow_store  # FlowStore，查詢過的日期順便存入法人買賣超歷史
+        self.session = requests.Session()
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+        self.driver = None
+        self.browser_lock = threading.Lock()  # WebDriver 不是執行緒安全的
 
     def get_institutional_investors_data(self, date):
-        self.driver.get(self.url)
-        
+        df = self._get_day(date)
+        if df is None:
+            # HTTP 重試後仍失敗
+            return self._get_data_by_browser(date) if self.browser_fallback else pd.DataFrame()
+        return df
+
+    def _get_day(self, date):
+        """不含瀏覽器備援的查詢；HTTP 重試後仍失敗時回傳 None。"""
+        if self.calendar and not self.calendar.is_trading_day(date, 'tse'):
+            print(f"{date} 為休市日，略過查詢")
+            return pd.DataFrame()
+
+        if self.use_browser:
+            return self._get_data_by_browser(date)
+        try:
+            return self._get_data_by_http(date)
+        except Exception as e:
+            print(f"以 HTTP 取得 {date} 三大法人資料時發生錯誤：{str(e)}")
+            return None
+
+    def _download(self, url):
+        """依 RetryPolicy 重試下載，回傳 (原始內容, 解析後的 JSON)；放棄時拋出最後一次的例外。"""
+        for attempt in range(self.retry_policy.max_attempts):
+            response = None
+            self.retry_policy.before_request(url)
+            self.rate_limiter.acquire(url)
+            try:
+                response = self.session.get(url, headers=self.headers, timeout=30)
+                response.raise_for_status()
+                report = json.loads(response.content.decode('utf-8'))
+                self.retry_policy.on_success(url)
+                return response.content, report
+            except Exception as e:
+                decision = self.retry_policy.decide(e, attempt, url, response, self.rate_limiter)
+                if decision.action != 'retry':
+                    raise
+                print(f"嘗試 {attempt + 1} 下載 {url} 時出錯（{decision.error_class}）：{str(e)}")
+                time.sleep(decision.delay)
+
+    def _get_data_by_http(self, date):
+        """直接下載 T86 JSON 報表，欄位與網頁上的表格相同（數字保留千分位字串）。"""
+        western_date = to_western_date(date)
+        cached = self.cache.get('t86', western_date) if self.cache else None
+        if cached is not None:
+            content = cached[0]
+            report = json.loads(content.decode('utf-8'))
+        else:
+            url = f"{self.base_url}?date={western_date}&selectType=ALL&response=json"
+            content, report = self._download(url)
+
+        if report.get('stat') != 'OK' or not report.get('data'):
+            print(f"{date} 沒有三大法人買賣超資料：{report.get('stat')}")
+            if self.calendar:
+                self.calendar.mark_non_trading(western_date, 'tse')
+            return pd.DataFrame()
+        if self.cache and cached is None:
+            self.cache.put('t86', western_date, content, 'utf-8')
+
+        fields = [field.strip() for field in report['fields']]
+        df = pd.DataFrame(report['data'], columns=fields)
+        df['證券代號'] = df['證券代號'].str.strip()
+        df['證券名稱'] = df['證券名稱'].str.strip()
+        return df
+
+    def _get_driver(self):
+        # Selenium 只在需要瀏覽器時才載入
+        if self.driver is None:
+            from selenium import webdriver
+            self.driver = webdriver.Chrome()
+        return self.driver
+
+    def _get_data_by_browser(self, date):
+        # 同一時間只讓一個執行緒操作瀏覽器
+        with self.browser_lock:
+            return self._browse(date)
+
+    def _browse(self, date):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import Select
+
+        driver = self._get_driver()
+        driver.get(self.url)
+
         # 解析日期
         year, month, day = date.split('/')
-        
+
         # 轉換民國年為西元年
         year = str(int(year) + 1911)
-        
+
         # 選擇年份
-        Select(self.driver.find_element(By.NAME, "yy")).select_by_value(year)
-        
+        Select(driver.find_element(By.NAME, "yy")).select_by_value(year)
+
         # 選擇月份
-        Select(self.driver.find_element(By.NAME, "mm")).select_by_value(month)
-        
+        Select(driver.find_element(By.NAME, "mm")).select_by_value(month)
+
         # 選擇日期
-        Select(self.driver.find_element(By.NAME, "dd")).select_by_value(day)
-        
+        Select(driver.find_element(By.NAME, "dd")).select_by_value(day)
+
         # 點擊查詢按鈕
-        self.driver.find_element(By.CSS_SELECTOR, "button.button.search").click()
-        
+        driver.find_element(By.CSS_SELECTOR, "button.button.search").click()
+
         # 等待表格加載
-        WebDriverWait(self.driver, 10).until(
+        WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "table.table"))
         )
-        
+
         # 獲取表格數據
-        table = self.driver.find_element(By.CSS_SELECTOR, "table.table")
+        table = driver.find_element(By.CSS_SELECTOR, "table.table")
         html = table.get_attribute('outerHTML')
-        
+
         # 使用 pd.read_html() 解析表格，並處理可能的異常
         try:
             df = pd.read_html(html)[0]
@@ -55,17 +160,43 @@ class InstitutionalInvestors:
             print(f"解析表格時發生錯誤：{str(e)}")
             return pd.DataFrame()
 
+    def get_institutional_investors_range(self, start_date, end_date):
+        """並行取得日期區間內每個交易日的資料，回傳 {民國日期: DataFrame}。"""
+        if self.calendar:
+            date_range = self.calendar.trading_days(start_date, end_date, 'tse')
+        else:
+            date_range = pd.date_range(start=start_date, end=end_date, freq='B')
+        dates = [f"{date.year - 1911}/{date.month:02d}/{date.day:02d}" for date in date_range]
+        return self.get_institutional_investors_days(dates)
+
+    def get_institutional_investors_days(self, dates):
+        """並行取得指定交易日（民國日期）的資料，回傳 {民國日期: DataFrame}，沒有資料的日期不列入。
+
+        執行緒池只走 HTTP；重試後仍失敗的日期等池結束後，再於同一個執行緒依序以瀏覽器補抓。
+        """
+        with ThreadPoolExecutor(max_workers=1 if self.use_browser else self.max_workers) as executor:
+            results = dict(zip(dates, executor.map(self._get_day, dates)))
+        failed = [date for date, df in results.items() if df is None]
+        if failed and self.browser_fallback:
+            print(f"改用瀏覽器補抓 {len(failed)} 個日期")
+            for date in failed:
+                results[date] = self._get_data_by_browser(date)
+        return {date: df for date, df in results.items() if df is not None and not df.empty}
+
     def search_institutional_buying(self, date, min_foreign=0, min_investment_trust=0):
         df = self.get_institutional_investors_data(date)
-        
+
         if df.empty:
             print(f"{date} 沒有可用的三大法人買賣超資料")
             return pd.DataFrame()
 
         # 處理數據，篩選符合條件的股票
         try:
-            df['外資買超張數'] = pd.to_numeric(df['外陸資買賣超股數(不含外資自營商)'].str.replace(',', ''), errors='coerce') / 1000
-            df['投信買超張數'] = pd.to_numeric(df['投信買賣超股數'].str.replace(',', ''), errors='coerce') / 1000
+            # 千分位字串只解析一次；有 flow_store 時同時寫入歷史
+            parsed = self.flow_store.append_t86(df, date) if self.flow_store else parse_t86(df)
+            codes = df['證券代號'].astype(str).str.strip()
+            df['外資買超張數'] = parsed['foreign'].reindex(codes).to_numpy() / 1000
+            df['投信買超張數'] = parsed['trust'].reindex(codes).to_numpy() / 1000
 
             result = df[(df['外資買超張數'] >= min_foreign) & (df['投信買超張數'] >= min_investment_trust)]
             return result[['證券代號', '證券名稱', '外資買超張數', '投信買超張數']]
@@ -74,8 +205,9 @@ class InstitutionalInvestors:
             return pd.DataFrame()
 
     def __del__(self):
-        if hasattr(self, 'driver'):
+        if getattr(self, 'driver', None) is not None:
             self.driver.quit()
+            self.driver = None
 
 # 使用示例
 if __name__ == "__main__":
@@ -93,4 +225,4 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"發生錯誤：{str(e)}")
     finally:
-        fetcher.__del__()
\ No newline at end of file
+        fetcher.__del__()
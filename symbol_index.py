@@ -0,0 +1,163 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class SymbolIndex:
+    """單一股票的隨機存取索引：<root>/<market>/index/ 下的 values.npy 與 index.json。
+
+    values.npy 是 (列容量, 日容量) 的 float32 陣列，每檔股票一列、整段歷史連續存放，以記憶體映射讀取，
+    查一檔股票只讀取那一列，不需要解析整個寬表；index.json 記錄代號到列號的對照與每一欄的日期。
+    欄位依寫入順序排列（讀取時再依日期排序），新增交易日只需寫入一欄，補回舊日期也不必重建；
+    容量不足時才以兩倍容量重寫。PriceStore 寫入分區後會自動呼叫 sync()。
+    """
+
+    def __init__(self, market, root='store', field='close'):
+        self.market = market
+        self.field = field
+        self.dir = os.path.join(root, market, 'index')
+        self.values_path = os.path.join(self.dir, 'values.npy')
+        self.index_path = os.path.join(self.dir, 'index.json')
+        self.values = None
+        self.loaded_mtime = None
+        self._reset()
+        self.refresh()
+
+    def _reset(self):
+        self.symbols = []
+        self.rows = {}
+        self.columns = []   # [{'date', 'label', 'sha256'}]，依寫入順序
+        self.positions = {}
+        self.order = np.zeros(0, dtype=np.intp)
+        self.labels = pd.Index([], dtype=object)
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    def refresh(self):
+        """其他行程更新過索引時重新載入（以 index.json 的修改時間判斷）。"""
+        if not self.exists():
+            return
+        mtime = os.path.getmtime(self.index_path)
+        if mtime == self.loaded_mtime:
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.symbols = index['symbols']
+        self.rows = {code: i for i, code in enumerate(self.symbols)}
+        self.columns = index['columns']
+        self._index_columns()
+        self.values = np.load(self.values_path, mmap_mode='r')
+        self.loaded_mtime = mtime
+
+    def _index_columns(self):
+        self.positions = {column['date']: i for i, column in enumerate(self.columns)}
+        self.order = np.argsort([column['date'] for column in self.columns], kind='stable')
+        self.labels = pd.Index([self.columns[i]['label'] for i in self.order], dtype=object)  # 依日期排序的原始欄名
+
+    @property
+    def dates(self):
+        return [self.columns[i]['date'] for i in self.order]
+
+    def series(self, code):
+        """單一股票的完整收盤價序列（依日期排序，索引為原始欄名）。"""
+        self.refresh()
+        row = self.rows.get(str(code))
+        if row is None:
+            raise KeyError(f"索引中沒有股票代碼 {code}")
+        values = self.values[row, :len(self.columns)][self.order]
+        return pd.Series(values.astype('float64'), index=self.labels, name=str(code))
+
+    def batch(self, codes):
+        """多檔股票的寬表（列為代號、欄為日期），不存在的代號會被略過。"""
+        self.refresh()
+        codes = [str(code) for code in codes if str(code) in self.rows]
+        rows = np.fromiter((self.rows[code] for code in codes), dtype=np.intp, count=len(codes))
+        # 依列號排序後讀取，記憶體映射的存取較連續
+        sort = np.argsort(rows)
+        values = np.empty((len(codes), len(self.columns)), dtype='float32')
+        values[sort] = self.values[rows[sort], :len(self.columns)]
+        df = pd.DataFrame(values[:, self.order].astype('float64'), index=pd.Index(codes, name='證券代號'),
+                          columns=self.labels)
+        return df
+
+    def sync(self, store):
+        """讓索引與 PriceStore 一致：只寫入新增或內容改變的交易日，回傳寫入的天數。"""
+        self.refresh()
+        changed = [(date, info) for date, info in sorted(store.manifest['partitions'].items())
+                   if date not in self.positions or self.columns[self.positions[date]]['sha256'] != info['sha256']]
+        if not changed:
+            return 0
+        days = [(date, info, store.read_day(date, self.field)) for date, info in changed]
+        codes = {code for _, _, day in days for code in day.index}
+        new_codes = sorted(codes.difference(self.rows))
+        new_dates = sum(1 for date, _ in changed if date not in self.positions)
+        self._ensure_capacity(len(self.symbols) + len(new_codes), len(self.columns) + new_dates)
+        for code in new_codes:
+            self.rows[code] = len(self.symbols)
+            self.symbols.append(code)
+        values = np.load(self.values_path, mmap_mode='r+')
+        for date, info, day in days:
+            if date in self.positions:
+                position = self.positions[date]
+                self.columns[position] = {'date': date, 'label': info['label'], 'sha256': info['sha256']}
+            else:
+                position = len(self.columns)
+                self.columns.append({'date': date, 'label': info['label'], 'sha256': info['sha256']})
+                self.positions[date] = position
+            column = np.full(values.shape[0], np.nan, dtype='float32')
+            column[[self.rows[code] for code in day.index]] = day.to_numpy(dtype='float32')
+            values[:, position] = column
+        values.flush()
+        del values
+        self._save_index()
+        return len(days)
+
+    def build(self, store):
+        """由 PriceStore 重新建立整個索引。"""
+        self._reset()
+        for path in (self.values_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return self.sync(store)
+
+    def _ensure_capacity(self, num_rows, num_columns):
+        current = np.load(self.values_path, mmap_mode='r') if os.path.exists(self.values_path) else None
+        rows, columns = current.shape if current is not None else (0, 0)
+        if num_rows <= rows and num_columns <= columns:
+            return
+        # 兩倍成長，攤提後每新增一天只需寫一欄
+        new_rows = max(num_rows, rows * 2, 64) if num_rows > rows else rows
+        new_columns = max(num_columns, columns * 2, 64) if num_columns > columns else columns
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self.values_path + '.tmp'
+        grown = np.lib.format.open_memmap(tmp, mode='w+', dtype='float32', shape=(new_rows, new_columns))
+        grown[:] = np.nan
+        if current is not None:
+            grown[:rows, :columns] = current
+        grown.flush()
+        del grown, current
+        os.replace(tmp, self.values_path)
+
+    def _save_index(self):
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'market': self.market, 'field': self.field, 'symbols': self.symbols, 'columns': self.columns},
+                      f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+        self._index_columns()
+        self.loaded_mtime = None
+        self.refresh()
+
+
+# 使用示例
+if __name__ == "__main__":
+    from price_store import PriceStore
+    for market in ['otc', 'tse']:
+        store = PriceStore(market)
+        if store.exists():
+            index = SymbolIndex(market)
+            print(f"{market} 索引更新了 {index.sync(store)} 個交易日")
+    print(SymbolIndex('tse').series('2330').tail())
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+TSE_HEADER = ['證券代號', '證券名稱', '成交股數', '成交筆數', '成交金額', '開盤價', '最高價', '最低價', '收盤價',
+              '漲跌(+/-)', '漲跌價差', '最後揭示買價', '最後揭示買量', '最後揭示賣價', '最後揭示賣量', '本益比']
+OTC_HEADER = ['代號', '名稱', '收盤 ', '漲跌', '開盤 ', '最高 ', '最低', '均價 ', '成交股數  ', '成交金額(元)', '成交筆數 ',
+              '最後買價', '最後買量(千股)', '最後賣價', '最後賣量(千股)', '發行股數 ', '次日參考價 ', ' 次日漲停價 ', '次日跌停價']
+
+
+def make_codes(n_symbols, seed=0):
+    """產生混合普通股、ETF、債券 ETF 與權證的證券代號。"""
+    rng = np.random.default_rng(seed)
+    kinds = rng.choice(['stock', 'etf', 'bond', 'warrant'], size=n_symbols, p=[0.5, 0.05, 0.05, 0.4])
+    codes = []
+    for i, kind in enumerate(kinds):
+        if kind == 'stock':
+            codes.append(f'{1101 + i % 8800:04d}')
+        elif kind == 'etf':
+            codes.append(f'00{6000 + i % 4000}')
+        elif kind == 'bond':
+            codes.append(f'00{600 + i % 400:03d}B')
+        else:
+            codes.append(f'7{i % 100000:05d}')
+    return list(dict.fromkeys(codes))
+
+
+def _fmt(value):
+    return f'{value:,.2f}'
+
+
+def _quote_rows(codes, rng):
+    close = rng.uniform(5, 1500, len(codes)).round(2)
+    volume = rng.integers(0, 50_000_000, len(codes))
+    halted = rng.random(len(codes)) < 0.05
+    return close, volume, halted
+
+
+def _index_tables(date, index_rows):
+    """MI_INDEX 在個股行情前的指數區塊；實際下載約有兩百多列、十幾 KB。"""
+    title = f'{date[:4]}年{date[4:6]}月{date[6:]}日'
+    lines = [f'"{title} 價格指數(臺灣證券交易所)"',
+             '"指數","收盤指數","漲跌(+/-)","漲跌點數","漲跌百分比(%)","特殊處理註記"',
+             '"發行量加權股價指數","21,000.00","+","100.00","0.48",""']
+    lines += [f'"臺灣{i:03d}類指數","{1000 + i * 7.31:,.2f}","+","{i * 0.37:.2f}","{i * 0.01:.2f}",""'
+              for i in range(1, index_rows)]
+    if index_rows > 1:
+        lines += ['', f'"{title} 報酬指數(臺灣證券交易所)"', '"報酬指數","收盤指數","漲跌(+/-)","漲跌點數","漲跌百分比(%)"']
+        lines += [f'"臺灣{i:03d}類報酬指數","{2000 + i * 9.13:,.2f}","-","{i * 0.41:.2f}","{i * 0.02:.2f}",'
+                  for i in range(1, index_rows)]
+        lines += ['', '"大盤統計資訊"', '"成交統計","成交金額(元)","成交股數(股)","成交筆數"',
+                  '"1.一般股票","350,000,000,000","5,000,000,000","2,500,000"',
+                  '', '"漲跌證券數合計"', '"類型","整體市場","股票"', '"上漲(漲停)","5,000(100)","600(20)"']
+    return lines
+
+
+def make_tse_csv(n_symbols=1500, date='20240905', seed=0, index_rows=1):
+    """產生與 MI_INDEX?response=csv&type=ALL 相同結構的 TSE 行情文字。
+
+    index_rows 為個股行情前指數區塊的列數；預設 1 列讓基準測試結果可互相比較，
+    設為 200 左右時表頭會落在檔案 10 KB 以後，與實際下載的檔案相同。
+    """
+    rng = np.random.default_rng(seed)
+    codes = make_codes(n_symbols, seed)
+    close, volume, halted = _quote_rows(codes, rng)
+    lines = _index_tables(date, index_rows)
+    lines += ['', '"每日收盤行情(全部)"',
+              ','.join(f'"{column}"' for column in TSE_HEADER) + ',']
+    for code, price, vol, stop in zip(codes, close, volume, halted):
+        text = '--' if stop else _fmt(price)
+        lines.append(f'"{code}","名稱{code}","{vol:,}","{vol // 1000:,}","{vol * 10:,}","{text}","{text}","{text}",'
+                     f'"{text}","+","0.00","{text}","1","{text}","1","0.00",')
+    lines += ['', '"備註:"', '"符號說明:+/-/X表示漲/跌/不比價"']
+    return '\n'.join(lines)
+
+
+def make_otc_payload(n_symbols=12000, date='1130905', seed=0):
+    """產生與 stk_quote_download.php 相同結構的 Big5 上櫃行情位元組。"""
+    rng = np.random.default_rng(seed)
+    codes = make_codes(n_symbols, seed)
+    close, volume, halted = _quote_rows(codes, rng)
+    lines = ['上櫃股票行情(含等價、零股、盤後、鉅額交易)', f'資料日期:{int(date[:3]) + 1911}/{date[3:5]}/{date[5:]}',
+             ','.join(OTC_HEADER)]
+    for code, price, vol, stop in zip(codes, close, volume, halted):
+        text = '---' if stop else _fmt(price)
+        fields = [code, f'名稱{code}', text, '+0.10', text, text, text, text, f'{vol:,}', f'{vol * 10:,}',
+                  f'{vol // 1000:,}', text, '1', text, '1', '1,000,000', text, text, text]
+        lines.append(','.join(f'"{field}"' for field in fields))
+    lines += ['"上櫃家數","827"', '"總成交金額","91,991,670,225"']
+    return '\r\n'.join(lines).encode('big5')
+
+
+def make_price_matrix(n_symbols=2000, n_days=60, nan_ratio=0.02, start_date='2024-07-01', seed=0):
+    """產生 (股票數 × 交易日數) 的收盤價寬表，欄名為 YYYYMMDD，含停牌造成的 NaN。"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.02, (n_symbols, n_days))
+    prices = rng.uniform(10, 500, (n_symbols, 1)) * np.exp(np.cumsum(returns, axis=1))
+    prices[rng.random(prices.shape) < nan_ratio] = np.nan
+    dates = pd.bdate_range(start_date, periods=n_days).strftime('%Y%m%d')
+    index = pd.Index(make_codes(n_symbols * 2, seed)[:n_symbols], name='證券代號')
+    return pd.DataFrame(prices[:len(index)].round(2), index=index, columns=dates)
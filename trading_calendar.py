@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from cache import to_western_date
+
+
+@contextmanager
+def _file_lock(path, stale_after=30):
+    """以 O_EXCL 建立 <path>.lock 作為跨行程的鎖（Windows 也適用）；超過 stale_after 秒的鎖檔視為遺留並接手。"""
+    lock_path = path + '.lock'
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_after:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+class TradingCalendar:
+    """交易日曆：記錄已知的休市日，在發送任何網路請求前先排除。
+
+    休市日有兩個來源：
+    1. 匯入的假日清單（例如 data/holidays.txt，每行一個日期，# 開頭為註解）
+    2. 抓取時學到的空回應：伺服器正常回應但沒有行情表的過去日期
+    學到的日期會寫入 learned_file，下次執行時直接略過；多個行程（例如 pipeline 的各市場）共用同一個檔案，
+    寫入時會在檔案鎖內先合併其他行程已寫入的日期。
+    """
+
+    def __init__(self, holiday_file=os.path.join('data', 'holidays.txt'),
+                 learned_file=os.path.join('data', 'trading_calendar.json')):
+        self.learned_file = learned_file
+        self.holidays = set()
+        self.learned = {}  # {'tse': set(...), 'otc': set(...)}
+        self.lock = threading.Lock()
+        if holiday_file and os.path.exists(holiday_file):
+            self.import_holidays(holiday_file)
+        self._load_learned()
+
+    def import_holidays(self, path):
+        """匯入假日清單，支援西元與民國日期格式。"""
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                if line:
+                    self.holidays.add(to_western_date(line.split(',')[0]))
+
+    def _read_learned(self):
+        if self.learned_file and os.path.exists(self.learned_file):
+            with open(self.learned_file, 'r', encoding='utf-8') as f:
+                return {market: set(dates) for market, dates in json.load(f).items()}
+        return {}
+
+    def _load_learned(self):
+        self.learned = self._read_learned()
+
+    def save(self):
+        if not self.learned_file:
+            return
+        directory = os.path.dirname(self.learned_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with self.lock, _file_lock(self.learned_file):
+            # 其他行程可能在這段期間學到別的日期，先合併再寫回
+            for market, dates in self._read_learned().items():
+                self.learned.setdefault(market, set()).update(dates)
+            data = {market: sorted(dates) for market, dates in self.learned.items()}
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.learned_file), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.learned_file)
+
+    def mark_non_trading(self, date, market=None):
+        """記錄一個沒有行情的日期；當天與未來的日期可能只是尚未公布，不會被記錄。"""
+        date = to_western_date(date)
+        if date >= datetime.now().strftime('%Y%m%d'):
+            return
+        with self.lock:
+            self.learned.setdefault(market or 'all', set()).add(date)
+        self.save()
+
+    def is_trading_day(self, date, market=None):
+        """查詢某日是否可能為交易日（週末、已知假日與學到的休市日回傳 False）。"""
+        date = to_western_date(date)
+        if pd.Timestamp(date).weekday() >= 5 or date in self.holidays:
+            return False
+        if date in self.learned.get('all', ()):
+            return False
+        return not (market and date in self.learned.get(market, ()))
+
+    def trading_days(self, start_date, end_date, market=None):
+        """回傳區間內可能的交易日（DatetimeIndex）。"""
+        date_range = pd.date_range(start=start_date, end=end_date, freq='B')
+        mask = [self.is_trading_day(d.strftime('%Y%m%d'), market) for d in date_range]
+        return date_range[mask]
+
+
+# 使用示例
+if __name__ == "__main__":
+    calendar = TradingCalendar()
+    print(calendar.trading_days('2024-09-01', '2024-09-30', 'tse'))
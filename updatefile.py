@@ -1,7 +1,10 @@
 from pathlib import Path
 import os
 from filter import filter_four_digit_stocks
-from caculate import calculate_and_sort_gains
+from caculate import calculate_and_sort_gains, save_sorted_gains
+from incremental import incremental_gains
+from classification import select
+from price_store import PriceStore
 def read_date(file_name):
     try:
         with open(file_name, 'r') as f:
@@ -32,13 +35,36 @@ def update_date(old_date, new_date,day):
                 print(f"錯誤：輸入文件 {input_file} 不存在")
         except Exception as e:
             print(f"處理 {market} 市場文件時發生錯誤：{str(e)}")
+def update_from_store(day, start_date=None, end_date=None, incremental=True):
+    # 直接從分區儲存讀取價格，不需要 date.txt/olddate.txt 與中間的 filtered_*.csv
+    # incremental 為 True 且未指定日期區間時，只處理新增的交易日
+    for market in ['otc', 'tse']:
+        store = PriceStore(market)
+        rate_file = Path(f'{market}/stock_gains_5d_10d_20d_{day}_sorted.csv')
+        if not store.exists():
+            print(f"錯誤：{store.dir} 沒有任何價格分區")
+            continue
+        try:
+            if incremental and not (start_date or end_date):
+                gains = select(incremental_gains(store), ('four_digit',), market)
+                save_sorted_gains(gains, rate_file, sort_period=f'{day}天')
+                continue
+            df = store.read_matrix(start_date, end_date)
+            filtered_df = select(df, ('four_digit',), market)
+            calculate_and_sort_gains(filtered_df, rate_file, sort_period=f'{day}天')
+        except Exception as e:
+            print(f"處理 {market} 市場數據時發生錯誤：{str(e)}")
 
  
 
 if __name__ == "__main__":
+    day=5
+    if PriceStore('otc').exists() or PriceStore('tse').exists():
+        # 已改用分區儲存時，交給 pipeline 依序抓取、過濾、計算漲幅（兩個市場平行）
+        from pipeline import run_pipeline
+        raise SystemExit(1 if run_pipeline(day=day) else 0)
     new_date = read_date('date.txt')
     old_date = read_date('olddate.txt')
-    day=5
     if new_date and old_date:
         update_date(old_date, new_date,day)
     else: